@@ -0,0 +1,169 @@
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # keep stdout pure JSON lines
+
+import pygame  # noqa: E402
+
+from jetblack import (  # noqa: E402
+    Debris,
+    EnemySaucer,
+    Game,
+    GameState,
+    PlayerInput,
+    Resources,
+    ScriptedInput,
+    SimulatedClock,
+    get_random_position,
+    get_random_velocity,
+)
+
+PHASES = [
+    '_update_positions',
+    'check_player_bullet_collisions',
+    'check_player_collision',
+    'draw_frame',
+    'game_loop',
+]
+
+
+def build_game(num_asteroids, num_bullets, has_saucer, is_player_dead, seed, num_ticks=0, entity_store=False,
+               resources=None):
+    inputs = [PlayerInput(rotation_direction=1, is_accelerating=True, is_shooting=True)] * num_ticks
+    game = Game(
+        input_source=ScriptedInput(inputs),
+        clock=SimulatedClock(),
+        entity_store=entity_store,
+        seed=seed,
+        resources=resources,
+    )
+    game.game_state = GameState.RUNNING
+    game.asteroids = [game.new_asteroid() for _ in range(num_asteroids)]
+    for _ in range(num_bullets):
+        game.player_bullets.append(game.new_bullet(get_random_position(game.rng), get_random_velocity(game.rng)))
+    if has_saucer:
+        game.saucer = EnemySaucer(get_random_position(game.rng), rng=game.rng)
+    if is_player_dead:
+        game.player.is_dead = True
+        if game.particles is not None:
+            game.particles.emit_ship_explosion(game.player.get_position())
+        else:
+            game.debris = Debris(game.player.get_position(), rng=game.rng)
+        game.game_state = GameState.GAME_OVER
+    return game
+
+
+def time_call(game, phase):
+    if phase == '_update_positions':
+        call = lambda: game._update_positions(False, 1)  # noqa: E731
+    else:
+        call = getattr(game, phase)
+    start = time.perf_counter_ns()
+    call()
+    return time.perf_counter_ns() - start
+
+
+def run_scenario(args, resources, num_asteroids, num_bullets):
+    scenario = dict(
+        asteroids=num_asteroids,
+        bullets=num_bullets,
+        saucer=args.saucer,
+        player_dead=args.player_dead,
+        entity_store=args.entity_store,
+    )
+    timings = dict()
+    for phase in PHASES[:-1]:
+        timings[phase] = []
+        for _ in range(args.repeat):
+            # collisions destroy and split entities (releasing their store slots) and movement happens in place,
+            # so every repetition starts from a freshly built scenario
+            game = build_game(num_asteroids, num_bullets, args.saucer, args.player_dead, args.seed,
+                              entity_store=args.entity_store, resources=resources)
+            if phase == 'check_player_collision':
+                # the player check reuses the broadphase grid built by the bullet check each tick
+                game.rebuild_asteroid_grid()
+            timings[phase].append(time_call(game, phase))
+    game = build_game(num_asteroids, num_bullets, args.saucer, args.player_dead, args.seed,
+                      num_ticks=args.repeat, entity_store=args.entity_store, resources=resources)
+    timings['game_loop'] = []
+    for _ in range(args.repeat):
+        start = time.perf_counter_ns()
+        game.game_loop()
+        timings['game_loop'].append(time.perf_counter_ns() - start)
+    return scenario, timings
+
+
+def summarize(timings_ns):
+    timings_ms = [t / 1e6 for t in timings_ns]
+    return dict(
+        min_ms=min(timings_ms),
+        median_ms=statistics.median(timings_ms),
+        mean_ms=statistics.fmean(timings_ms),
+        max_ms=max(timings_ms),
+    )
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the phases of the jetblack game loop on synthetic scenarios.')
+    parser.add_argument('--asteroids', type=int, nargs='+', default=[10, 30, 100, 300, 1000, 3000, 10000],
+                        help='asteroid counts to sweep')
+    parser.add_argument('--bullets', type=int, nargs='+', default=[50], help='player bullet counts to sweep')
+    parser.add_argument('--no-saucer', dest='saucer', action='store_false', help='leave the saucer out')
+    parser.add_argument('--player-dead', action='store_true', help='start in the game over state')
+    parser.add_argument('--entity-store', action='store_true', help='use the numpy entity store')
+    parser.add_argument('--repeat', type=int, default=20, help='timed calls per phase and scenario')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='append JSON lines here instead of printing them')
+    args = parser.parse_args()
+
+    environment = dict(
+        commit=get_commit(),
+        python=platform.python_version(),
+        pygame=pygame.version.ver,
+        video_driver=os.environ['SDL_VIDEODRIVER'],
+    )
+    output = open(args.output, 'a') if args.output else sys.stdout
+    # one display and one set of preloaded asteroid shapes for every game the sweep builds
+    resources = Resources()
+    previous = dict()
+    for num_bullets in args.bullets:
+        for num_asteroids in args.asteroids:
+            scenario, timings = run_scenario(args, resources, num_asteroids, num_bullets)
+            for phase in PHASES:
+                record = dict(benchmark=phase, **scenario, **summarize(timings[phase]), **environment)
+                # growth exponent against the previous sweep point: ~1 is linear, ~2 quadratic
+                key = (phase, num_bullets)
+                if key in previous and previous[key][0] != num_asteroids:
+                    previous_asteroids, previous_median = previous[key]
+                    record['scaling_exponent'] = (
+                        math.log(record['median_ms'] / previous_median)
+                        / math.log(num_asteroids / previous_asteroids)
+                    )
+                previous[key] = (num_asteroids, record['median_ms'])
+                output.write(json.dumps(record) + '\n')
+            output.flush()
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == '__main__':
+    main()
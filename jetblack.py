@@ -1,19 +1,50 @@
+import argparse
+from collections import OrderedDict, deque, namedtuple
+import csv
 from enum import Enum
+import gc
+import json
 import random
 import math
 from pathlib import Path
+import queue
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+import zlib
 
 import pygame
 
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the array-backed entity store and the particle system
+    np = None
+
+
+ASSETS_DIR = Path(__file__).resolve().parent
+
 
 class DISPLAY_PARAMS:
     width = 1600
     height = 900
     max_fps = 60
+    tick_rate = 60  # simulation steps per second, independent of the frame rate
     bg_color = (0, 0, 0)
     # bg_color = (30, 30, 30)
 
 
+class EntityKind:
+    NONE = 0
+    PLAYER = 1
+    ASTEROID = 2
+    PLAYER_BULLET = 3
+    SAUCER = 4
+    SAUCER_BULLET = 5
+
+
 class GameState(Enum):
     STARTING = 1
     RUNNING = 2
@@ -35,22 +66,536 @@ def wrap_coordinates(point):
     return pygame.Vector2(x, y)
 
 
-def get_random_position():
+def wrap_coordinates_in_place(vector):
+    # same as wrap_coordinates() without allocating, for vectors that are not shared
+    if vector.x < 0:
+        vector.x += DISPLAY_PARAMS.width
+    elif vector.x >= DISPLAY_PARAMS.width:
+        vector.x -= DISPLAY_PARAMS.width
+    if vector.y < 0:
+        vector.y += DISPLAY_PARAMS.height
+    elif vector.y >= DISPLAY_PARAMS.height:
+        vector.y -= DISPLAY_PARAMS.height
+    return vector
+
+
+def move_in_place(position, normalized_velocity, speed):
+    # position + normalized_velocity * speed, wrapped, without allocating intermediate vectors
+    position.x += normalized_velocity.x * speed
+    position.y += normalized_velocity.y * speed
+    return wrap_coordinates_in_place(position)
+
+
+def interpolate_rect(rect, normalized_velocity, speed, alpha):
+    # steps the rect back along its velocity; alpha = 0 gives the previous tick, alpha = 1 the current one
+    if alpha >= 1:
+        return rect
+    backtrack = (1 - alpha) * speed
+    return rect.move(round(-normalized_velocity[0] * backtrack), round(-normalized_velocity[1] * backtrack))
+
+
+def masks_overlap(first_mask, first_rect, second_mask, second_rect):
+    offset = (second_rect.x - first_rect.x, second_rect.y - first_rect.y)
+    return first_mask.overlap(second_mask, offset) is not None
+
+
+def get_random_position(rng=random):
     position = (
-        random.random() * DISPLAY_PARAMS.width - 1,
-        random.random() * DISPLAY_PARAMS.height - 1,
+        rng.random() * DISPLAY_PARAMS.width - 1,
+        rng.random() * DISPLAY_PARAMS.height - 1,
     )
     return pygame.Vector2(position)
 
 
-def get_random_velocity():
+def get_random_velocity(rng=random):
     normalized_velocity = pygame.Vector2(
-        2 * random.random() - 1,
-        2 * random.random() - 1
+        2 * rng.random() - 1,
+        2 * rng.random() - 1
     ).normalize()
     return normalized_velocity
 
 
+class SpatialHash:
+    # uniform grid over the toroidal playfield; cells wrap around the screen edges so
+    # rects straddling an edge are bucketed on both sides
+    def __init__(self, cell_size=100):
+        self.cell_size = cell_size
+        self.num_cols = math.ceil(DISPLAY_PARAMS.width / cell_size)
+        self.num_rows = math.ceil(DISPLAY_PARAMS.height / cell_size)
+        self.cells = dict()  # cell lists are emptied rather than dropped, so rebuilding every tick reuses them
+
+    def get_cell_keys(self, rect):
+        cell_size = self.cell_size
+        num_cols, num_rows = self.num_cols, self.num_rows
+        rows = [row % num_rows for row in range(rect.top // cell_size, (rect.bottom - 1) // cell_size + 1)]
+        for col in range(rect.left // cell_size, (rect.right - 1) // cell_size + 1):
+            col = col % num_cols
+            for row in rows:
+                yield row * num_cols + col
+
+    def clear(self):
+        for cell in self.cells.values():
+            cell.clear()
+
+    def insert(self, index, rect):
+        cells = self.cells
+        for key in self.get_cell_keys(rect):
+            if key in cells:
+                cells[key].append(index)
+            else:
+                cells[key] = [index]
+
+    def rebuild(self, rects):
+        self.clear()
+        for index, rect in enumerate(rects):
+            self.insert(index, rect)
+
+    def rebuild_from_arrays(self, topleft, sizes):
+        # vectorized rebuild from (n, 2) arrays of rect corners and sizes; rects are padded by a pixel so that
+        # rounding differences can only add cells, never drop one a rect touches
+        self.clear()
+        if not len(topleft):
+            return
+        first_cells = (topleft - 1) // self.cell_size
+        spans = (topleft + sizes) // self.cell_size - first_cells + 1
+        indices = np.arange(len(topleft))
+        keys = []
+        members = []
+        for col_offset in range(int(spans[:, 0].max())):
+            for row_offset in range(int(spans[:, 1].max())):
+                is_covered = (spans[:, 0] > col_offset) & (spans[:, 1] > row_offset)
+                cols = (first_cells[is_covered, 0] + col_offset) % self.num_cols
+                rows = (first_cells[is_covered, 1] + row_offset) % self.num_rows
+                keys.append(rows * self.num_cols + cols)
+                members.append(indices[is_covered])
+        keys = np.concatenate(keys)
+        members = np.concatenate(members)
+        order = np.argsort(keys, kind='stable')
+        unique_keys, starts = np.unique(keys[order], return_index=True)
+        cells = self.cells
+        for key, cell_members in zip(unique_keys.tolist(), np.split(members[order], starts[1:])):
+            if key in cells:
+                cells[key].extend(cell_members.tolist())
+            else:
+                cells[key] = cell_members.tolist()
+
+    def query(self, rect):
+        cells = self.cells
+        candidates = set()
+        for key in self.get_cell_keys(rect):
+            if key in cells:
+                candidates.update(cells[key])
+        return sorted(candidates)
+
+
+class PoissonDiskSampler:
+    # places points at least min_distance apart (measured around the screen edges) using a background grid
+    # whose cells hold about one point each, so each candidate is checked against a few cells only
+    MAX_DART_ATTEMPTS = 30
+    NUM_ANNULUS_CANDIDATES = 30
+    MAX_PACKING_DENSITY = math.pi / (2 * math.sqrt(3))  # hexagonal packing of discs
+
+    def __init__(self, min_distance, rng=random):
+        self.min_distance = min_distance
+        self.rng = rng
+        # cells tile the screen exactly so that wrapping never leaves a sliver cell behind
+        self.num_cols = max(1, int(DISPLAY_PARAMS.width * math.sqrt(2) / min_distance))
+        self.num_rows = max(1, int(DISPLAY_PARAMS.height * math.sqrt(2) / min_distance))
+        self.cell_width = DISPLAY_PARAMS.width / self.num_cols
+        self.cell_height = DISPLAY_PARAMS.height / self.num_rows
+        self.cells = dict()
+        self.points = []
+
+    def get_cell(self, point):
+        return int(point[0] // self.cell_width) % self.num_cols, int(point[1] // self.cell_height) % self.num_rows
+
+    def get_distance(self, first, second):
+        dx = abs(first[0] - second[0]) % DISPLAY_PARAMS.width
+        dy = abs(first[1] - second[1]) % DISPLAY_PARAMS.height
+        return math.hypot(min(dx, DISPLAY_PARAMS.width - dx), min(dy, DISPLAY_PARAMS.height - dy))
+
+    def is_valid(self, point):
+        # a neighbour closer than min_distance is at most two cells away; small grids wrap onto themselves
+        col, row = self.get_cell(point)
+        rows = {(row + i) % self.num_rows for i in range(-2, 3)}
+        for neighbor_col in {(col + i) % self.num_cols for i in range(-2, 3)}:
+            for neighbor_row in rows:
+                for other in self.cells.get((neighbor_col, neighbor_row), ()):
+                    if self.get_distance(point, other) < self.min_distance:
+                        return False
+        return True
+
+    def add(self, point):
+        cell = self.get_cell(point)
+        if cell in self.cells:
+            self.cells[cell].append(point)
+        else:
+            self.cells[cell] = [point]
+        self.points.append(point)
+
+    def sample(self, num_points, tabu_positions=()):
+        for position in tabu_positions:
+            self.add(pygame.Vector2(position))
+        num_tabu = len(self.points)
+        max_points = DISPLAY_PARAMS.width * DISPLAY_PARAMS.height * self.MAX_PACKING_DENSITY / (
+            math.pi * (self.min_distance / 2) ** 2)
+        if num_tabu + num_points > max_points:
+            raise ValueError(f'Cannot place {num_points} positions {self.min_distance} apart on the screen')
+        # dart throwing keeps sparse spawns uniformly random; give up after a run of misses
+        num_misses = 0
+        while len(self.points) - num_tabu < num_points and num_misses < self.MAX_DART_ATTEMPTS:
+            candidate = get_random_position(self.rng)
+            if self.is_valid(candidate):
+                self.add(candidate)
+                num_misses = 0
+            else:
+                num_misses += 1
+        # then fill the remaining gaps by growing from the accepted points (Bridson's algorithm)
+        active_points = list(self.points)
+        while len(self.points) - num_tabu < num_points:
+            if not active_points:
+                raise ValueError(f'Could only place {len(self.points) - num_tabu} of {num_points} positions '
+                                 f'{self.min_distance} apart on the screen')
+            i = self.rng.randrange(len(active_points))
+            origin = active_points[i]
+            for _ in range(self.NUM_ANNULUS_CANDIDATES):
+                offset = pygame.Vector2(self.rng.uniform(self.min_distance, 2 * self.min_distance), 0)
+                candidate = origin + offset.rotate(self.rng.random() * 360)
+                candidate.x %= DISPLAY_PARAMS.width
+                candidate.y %= DISPLAY_PARAMS.height
+                if self.is_valid(candidate):
+                    self.add(candidate)
+                    active_points.append(candidate)
+                    break
+            else:
+                active_points[i] = active_points[-1]
+                active_points.pop()
+        return self.points[num_tabu:]
+
+
+class PlayerInput:
+    def __init__(self, rotation_direction=0, is_accelerating=False, is_shooting=False,
+                 is_restarting=False, is_exiting=False, is_toggling_profiler=False):
+        self.rotation_direction = rotation_direction
+        self.is_accelerating = is_accelerating
+        self.is_shooting = is_shooting
+        self.is_restarting = is_restarting
+        self.is_exiting = is_exiting
+        self.is_toggling_profiler = is_toggling_profiler  # not part of the simulation, never recorded
+
+
+def encode_input_flags(player_input):
+    return (
+        (player_input.rotation_direction > 0)
+        | (player_input.rotation_direction < 0) << 1
+        | bool(player_input.is_accelerating) << 2
+        | bool(player_input.is_shooting) << 3
+        | bool(player_input.is_restarting) << 4
+        | bool(player_input.is_exiting) << 5
+    )
+
+
+def decode_input_flags(flags):
+    return PlayerInput(
+        rotation_direction=(flags & 1) - (flags >> 1 & 1),
+        is_accelerating=bool(flags & 4),
+        is_shooting=bool(flags & 8),
+        is_restarting=bool(flags & 16),
+        is_exiting=bool(flags & 32),
+    )
+
+
+class KeyboardInput:
+    def read(self):
+        is_toggling_profiler = False
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (
+                    event.type == pygame.KEYDOWN and pygame.key.get_pressed()[pygame.K_ESCAPE]):
+                return PlayerInput(is_exiting=True)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                is_toggling_profiler = not is_toggling_profiler
+        pressed_keys = pygame.key.get_pressed()
+        return PlayerInput(
+            rotation_direction=self.get_rotation_direction(pressed_keys),
+            is_accelerating=pressed_keys[pygame.K_w],
+            is_shooting=pressed_keys[pygame.K_SPACE],
+            is_restarting=pressed_keys[pygame.K_r],
+            is_toggling_profiler=is_toggling_profiler,
+        )
+
+    def get_rotation_direction(self, pressed_keys):
+        if pressed_keys[pygame.K_a]:
+            return 1  # counter-clockwise
+        elif pressed_keys[pygame.K_d]:
+            return -1
+        else:
+            return 0
+
+
+class ScriptedInput:
+    def __init__(self, inputs):
+        self.inputs = iter(inputs)
+
+    def read(self):
+        return next(self.inputs, PlayerInput(is_exiting=True))
+
+
+class RealtimeClock:
+    is_realtime = True
+
+    def __init__(self, max_fps):
+        self.max_fps = max_fps
+        self.clock = pygame.time.Clock()
+
+    def get_ticks(self):
+        return pygame.time.get_ticks()
+
+    def tick(self):
+        self.clock.tick(self.max_fps)
+
+    def get_fps(self):
+        return self.clock.get_fps()
+
+
+class SimulatedClock:
+    is_realtime = False
+
+    def __init__(self, fps=DISPLAY_PARAMS.tick_rate):
+        self.fps = fps
+        self.num_ticks = 0
+
+    def get_ticks(self):
+        return self.num_ticks * 1000 // self.fps
+
+    def tick(self):
+        self.num_ticks += 1
+
+    def get_fps(self):
+        return self.fps
+
+
+class Replay:
+    # seed plus one (input flags, elapsed ms) record per tick; enough to reproduce a whole game
+    MAGIC = b'JBRP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBQI')
+    FRAME = struct.Struct('<BH')
+
+    def __init__(self, seed, start_ticks):
+        self.seed = seed
+        self.start_ticks = start_ticks
+        self.frames = []
+        self.last_ticks = start_ticks
+
+    def append(self, player_input, ticks):
+        self.frames.append((encode_input_flags(player_input), ticks - self.last_ticks))
+        self.last_ticks = ticks
+
+    def save(self, path):
+        with open(path, 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, self.start_ticks))
+            for flags, elapsed_ticks in self.frames:
+                file.write(self.FRAME.pack(flags, elapsed_ticks))
+
+    @classmethod
+    def load(cls, path):
+        data = Path(path).read_bytes()
+        magic, version, seed, start_ticks = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError(f'{path} is not a jetblack replay (version {cls.VERSION})')
+        replay = cls(seed, start_ticks)
+        replay.frames = list(cls.FRAME.iter_unpack(data[cls.HEADER.size:]))
+        return replay
+
+
+class FrameRecorder:
+    # copies finished frames into a ring of preallocated buffers and leaves encoding and writing them to a
+    # background thread; when every buffer is still waiting for the writer, the frame is dropped and counted
+    # rather than stalling the game loop, unless is_blocking, which waits for a free buffer so that games not
+    # paced by a realtime clock keep every frame. zlib and file writes release the GIL, so the writer runs alongside
+    # the game; a failed write is raised from the next capture() or close()
+    MAGIC = b'JBCP'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBHHHBIIII?')  # width, height, pitch, bytes per pixel, RGBA masks, compressed
+    FRAME = struct.Struct('<QI')  # tick number, size of the (compressed) pixels
+
+    def __init__(self, path, surface, compress=True, num_buffers=8, compression_level=1, is_blocking=False):
+        self.compress = compress
+        self.is_blocking = is_blocking
+        self.compression_level = compression_level
+        width, height = surface.get_size()
+        self.file = open(path, 'wb')
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION, width, height, surface.get_pitch(),
+                                         surface.get_bytesize(), *surface.get_masks(), compress))
+        self.buffers = [bytearray(surface.get_pitch() * height) for _ in range(num_buffers)]
+        self.free_buffers = queue.SimpleQueue()
+        for index in range(num_buffers):
+            self.free_buffers.put(index)
+        self.pending_frames = queue.SimpleQueue()
+        self.num_captured = 0
+        self.num_dropped = 0
+        self.error = None  # raised by the writer thread, re-raised from capture() and close()
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+
+    def capture(self, surface, num_ticks):
+        if self.error is not None:
+            raise self.error
+        try:
+            index = self.free_buffers.get(block=self.is_blocking)
+        except queue.Empty:
+            self.num_dropped += 1
+            return False
+        if index is None:  # the writer failed while we were waiting
+            raise self.error
+        # copying between memoryviews writes straight into the buffer; assigning the BufferProxy to a bytearray
+        # slice would first build a temporary copy of the whole frame
+        memoryview(self.buffers[index])[:] = memoryview(surface.get_buffer())
+        self.pending_frames.put((index, num_ticks))
+        self.num_captured += 1
+        return True
+
+    def write_frames(self):
+        try:
+            while True:
+                frame = self.pending_frames.get()
+                if frame is None:
+                    break
+                index, num_ticks = frame
+                pixels = self.buffers[index]
+                if self.compress:
+                    pixels = zlib.compress(pixels, self.compression_level)
+                    self.free_buffers.put(index)  # the compressed copy is all the writer still needs
+                self.file.write(self.FRAME.pack(num_ticks, len(pixels)))
+                self.file.write(pixels)
+                if not self.compress:
+                    self.free_buffers.put(index)
+        except Exception as error:
+            self.error = error
+            self.free_buffers.put(None)  # wakes a capture() blocked on a free buffer
+
+    def close(self):
+        # waits for the frames already captured to be written
+        if self.writer.is_alive():
+            self.pending_frames.put(None)
+            self.writer.join()
+        self.file.close()
+        if self.error is not None:
+            raise self.error
+
+    @classmethod
+    def load(cls, path):
+        # yields (tick number, surface) for every frame of a capture
+        with open(path, 'rb') as file:
+            header = file.read(cls.HEADER.size)
+            magic, version, width, height, pitch, bytesize, *masks, compressed = cls.HEADER.unpack(header)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError(f'{path} is not a jetblack capture (version {cls.VERSION})')
+            while True:
+                frame = file.read(cls.FRAME.size)
+                if len(frame) < cls.FRAME.size:
+                    break
+                num_ticks, size = cls.FRAME.unpack(frame)
+                pixels = file.read(size)
+                if compressed:
+                    pixels = zlib.decompress(pixels)
+                surface = pygame.Surface((width, height), 0, bytesize * 8, masks)
+                if surface.get_pitch() != pitch:
+                    raise ValueError(f'Cannot restore frames with a row pitch of {pitch} bytes')
+                surface.get_buffer().write(pixels)
+                yield num_ticks, surface
+
+
+class ReplayPlayback:
+    # serves as both the input source and the clock of a game replaying a recording
+    is_realtime = False
+
+    def __init__(self, replay):
+        self.replay = replay
+        self.frames = iter(replay.frames)
+        self.ticks = replay.start_ticks
+
+    def read(self):
+        frame = next(self.frames, None)
+        if frame is None:
+            return PlayerInput(is_exiting=True)
+        flags, elapsed_ticks = frame
+        self.ticks += elapsed_ticks
+        return decode_input_flags(flags)
+
+    def get_ticks(self):
+        return self.ticks
+
+    def tick(self):
+        pass
+
+    def get_fps(self):
+        return 0.0
+
+
+class Snapshot:
+    # binary layout of a game's simulation state; sprites are not stored, asteroids refer to their shape cache key
+    MAGIC = b'JBSS'
+    VERSION = 3
+    HEADER = struct.Struct('<4sBB?QqqqIHHH?')
+    PLAYER = struct.Struct('<hhhhdddd?')
+    ASTEROID = struct.Struct('<dddddHB')
+    BULLET = struct.Struct('<ddddh')
+    SAUCER = struct.Struct('<dddd')
+    RNG = struct.Struct('<625Id')
+
+    @classmethod
+    def get_num_ticks(cls, snapshot):
+        return cls.HEADER.unpack_from(snapshot)[8]
+
+
+class RewindBuffer:
+    # recent snapshots within a memory budget: every keyframe_interval-th snapshot is a zlib-compressed keyframe
+    # and the rest are compressed with their keyframe as preset dictionary; whole keyframe groups are evicted.
+    # The budget includes the raw keyframes kept as dictionaries
+    def __init__(self, max_bytes=4 * 1024 * 1024, keyframe_interval=20):
+        self.max_bytes = max_bytes
+        self.keyframe_interval = keyframe_interval
+        self.groups = deque()  # [keyframe, compressed keyframe, compressed deltas]
+        self.num_bytes = 0
+
+    def __len__(self):
+        return sum(1 + len(deltas) for _, _, deltas in self.groups)
+
+    def get_num_bytes(self):
+        return self.num_bytes
+
+    def push(self, snapshot):
+        if not self.groups or len(self.groups[-1][2]) + 1 >= self.keyframe_interval:
+            data = zlib.compress(snapshot)
+            self.groups.append([snapshot, data, []])
+            self.num_bytes += len(snapshot)
+        else:
+            keyframe, _, deltas = self.groups[-1]
+            compressor = zlib.compressobj(zdict=keyframe)
+            data = compressor.compress(snapshot) + compressor.flush()
+            deltas.append(data)
+        self.num_bytes += len(data)
+        while self.num_bytes > self.max_bytes and len(self.groups) > 1:
+            keyframe, data, deltas = self.groups.popleft()
+            self.num_bytes -= len(keyframe) + len(data) + sum(len(delta) for delta in deltas)
+
+    def pop(self):
+        keyframe, data, deltas = self.groups[-1]
+        if deltas:
+            delta = deltas.pop()
+            self.num_bytes -= len(delta)
+            decompressor = zlib.decompressobj(zdict=keyframe)
+            return decompressor.decompress(delta) + decompressor.flush()
+        self.groups.pop()
+        self.num_bytes -= len(keyframe) + len(data)
+        return keyframe
+
+    def clear(self):
+        self.groups.clear()
+        self.num_bytes = 0
+
+
 class SoundMixer:
     def __init__(self):
         pygame.mixer.init()
@@ -58,9 +603,9 @@ class SoundMixer:
 
     def init_samples(self):
         samples = dict()
-        samples['shooting'] = pygame.mixer.Sound(Path('sounds') / 'shooting_1.wav')
-        samples['explosion_small'] = pygame.mixer.Sound(Path('sounds') / 'explosion_1.wav')
-        samples['explosion_large'] = pygame.mixer.Sound(Path('sounds') / 'explosion_2.wav')
+        samples['shooting'] = pygame.mixer.Sound(ASSETS_DIR / 'sounds' / 'shooting_1.wav')
+        samples['explosion_small'] = pygame.mixer.Sound(ASSETS_DIR / 'sounds' / 'explosion_1.wav')
+        samples['explosion_large'] = pygame.mixer.Sound(ASSETS_DIR / 'sounds' / 'explosion_2.wav')
         return samples
 
     def play_shooting(self):
@@ -73,48 +618,266 @@ class SoundMixer:
             self.samples['explosion_large'].play()
 
 
+class NullSoundMixer:
+    def play_shooting(self):
+        pass
+
+    def play_explosion(self, size=None):
+        pass
+
+
+def convert_sprite(surface):
+    # sprites in the window's pixel format blit without per-pixel conversion; offscreen and texture rendering
+    # have no display surface, so their sprites stay as drawn
+    if pygame.display.get_surface() is None:
+        return surface
+    return surface.convert()
+
+
+class SurfaceRenderer:
+    # software blits onto the window's display surface, or onto an offscreen surface when headless
+    supports_dirty_rects = True
+
+    def __init__(self, surface):
+        self.surface = surface
+
+    def get_frame_surface(self):
+        return self.surface
+
+    def fill(self, color, rect=None):
+        self.surface.fill(color, rect)
+
+    def blit(self, sprite, position):
+        return self.surface.blit(sprite, position)
+
+    def blits(self, blits):
+        return self.surface.blits(blits)
+
+    def blit_rotated(self, sprite, angle, center, rotated_sprite=None):
+        if rotated_sprite is None:
+            rotated_sprite = pygame.transform.rotate(sprite, angle)
+        return self.surface.blit(rotated_sprite, rotated_sprite.get_rect(center=center))
+
+    def draw_line(self, color, start, end):
+        return pygame.draw.line(self.surface, color, start, end)
+
+    def draw_rect(self, color, rect, width=0):
+        return pygame.draw.rect(self.surface, color, rect, width=width)
+
+    def set_caption(self, caption):
+        pygame.display.set_caption(caption)
+
+    def present(self, rects=None):
+        if rects is None:
+            pygame.display.update()
+        else:
+            pygame.display.update(rects)
+
+
+class TextureRenderer:
+    # draws through an SDL renderer: every sprite is uploaded once as a texture and the ship is rotated while
+    # drawing instead of picked from the rotation atlas. The whole window is presented every frame, so there
+    # are no dirty rects
+    supports_dirty_rects = False
+
+    def __init__(self, window, renderer):
+        self.window = window
+        self.renderer = renderer
+        self.textures = weakref.WeakKeyDictionary()  # forgets textures of sprites that are gone, e.g. old scores
+        self.frame_surface = None
+
+    @classmethod
+    def create(cls):
+        from pygame._sdl2 import sdl2, video
+
+        pygame.init()
+        window = video.Window('jetblack', size=(DISPLAY_PARAMS.width, DISPLAY_PARAMS.height))
+        try:
+            renderer = video.Renderer(window, accelerated=1)
+        except sdl2.error:
+            # no GPU driver, as on headless machines: SDL's software renderer still draws textures
+            renderer = video.Renderer(window, accelerated=0)
+        return cls(window, renderer)
+
+    def get_texture(self, sprite):
+        texture = self.textures.get(sprite)
+        if texture is None:
+            from pygame._sdl2 import video
+
+            texture = self.textures[sprite] = video.Texture.from_surface(self.renderer, sprite)
+        return texture
+
+    def get_frame_surface(self):
+        # reads the frame back into a surface that is allocated once; only valid before present()
+        if self.frame_surface is None:
+            self.frame_surface = pygame.Surface((DISPLAY_PARAMS.width, DISPLAY_PARAMS.height), 0, 32)
+        return self.renderer.to_surface(surface=self.frame_surface)
+
+    def fill(self, color, rect=None):
+        self.renderer.draw_color = (*color, 255)
+        if rect is None:
+            self.renderer.clear()
+        else:
+            self.renderer.fill_rect(rect)
+
+    def blit(self, sprite, position):
+        rect = pygame.Rect(position[0], position[1], sprite.get_width(), sprite.get_height())
+        self.get_texture(sprite).draw(dstrect=rect)
+        return rect
+
+    def blits(self, blits):
+        return [self.blit(sprite, position) for sprite, position in blits]
+
+    def blit_rotated(self, sprite, angle, center, rotated_sprite=None):
+        rect = sprite.get_rect(center=center)
+        self.get_texture(sprite).draw(dstrect=rect, angle=-angle)  # SDL turns clockwise, pygame anticlockwise
+        if rotated_sprite is None:
+            return rect
+        return rotated_sprite.get_rect(center=center)
+
+    def draw_line(self, color, start, end):
+        self.renderer.draw_color = (*color, 255)
+        self.renderer.draw_line(start, end)
+        left, right = sorted([start[0], end[0]])
+        top, bottom = sorted([start[1], end[1]])
+        return pygame.Rect(int(left), int(top), int(right) - int(left) + 1, int(bottom) - int(top) + 1)
+
+    def draw_rect(self, color, rect, width=0):
+        self.renderer.draw_color = (*color, 255)
+        if width:
+            self.renderer.draw_rect(rect)
+        else:
+            self.renderer.fill_rect(rect)
+        return pygame.Rect(rect)
+
+    def set_caption(self, caption):
+        self.window.title = caption
+
+    def present(self, rects=None):
+        self.renderer.present()
+
+
+class Resources:
+    # display, audio, fonts and shape caches are created on first use and then shared by every game
+    def __init__(self):
+        self.renderers = dict()
+        self.sound_mixers = dict()
+        self.fonts = dict()
+        self.texts = dict()
+        self.asteroid_shape_cache = None
+
+    def get_renderer(self, headless=False, backend='surface'):
+        if headless:
+            backend = 'surface'  # no window, the screen is only an offscreen target
+        key = (headless, backend)
+        if key not in self.renderers:
+            if backend not in ['surface', 'texture']:
+                raise ValueError(f'Unknown renderer: {backend}')
+            renderer = None
+            if headless:
+                pygame.font.init()
+                renderer = SurfaceRenderer(pygame.Surface((DISPLAY_PARAMS.width, DISPLAY_PARAMS.height)))
+            elif backend == 'texture':
+                try:
+                    renderer = TextureRenderer.create()
+                except (ImportError, RuntimeError):  # pygame's and the SDL2 module's errors are RuntimeErrors
+                    pass  # no SDL renderer at all, draw with blits instead
+            if renderer is None:
+                pygame.init()
+                pygame.display.set_caption('jetblack')
+                renderer = SurfaceRenderer(pygame.display.set_mode((DISPLAY_PARAMS.width, DISPLAY_PARAMS.height)))
+            self.renderers[key] = renderer
+        return self.renderers[key]
+
+    def get_sound_mixer(self, headless=False):
+        if headless not in self.sound_mixers:
+            self.sound_mixers[headless] = NullSoundMixer() if headless else SoundMixer()
+        return self.sound_mixers[headless]
+
+    def get_font(self, size):
+        if size not in self.fonts:
+            pygame.font.init()
+            self.fonts[size] = pygame.font.Font(pygame.font.get_default_font(), size)
+        return self.fonts[size]
+
+    def get_text(self, text, size, color):
+        # for static text only: every distinct string stays cached
+        key = (text, size, color)
+        if key not in self.texts:
+            self.texts[key] = self.get_font(size).render(text, True, color)
+        return self.texts[key]
+
+    def get_asteroid_shape_cache(self):
+        if self.asteroid_shape_cache is None:
+            self.asteroid_shape_cache = AsteroidShapeCache()
+            self.asteroid_shape_cache.preload()
+        return self.asteroid_shape_cache
+
+
 class Scoreboard:
-    def __init__(self, position):
-        self.font = pygame.font.Font(pygame.font.get_default_font(), 48)
+    def __init__(self, position, font):
+        self.font = font
         self.position = position
         self.score = 0
+        self.text_surface = None
 
     def get_score(self):
         return self.score
 
     def increment_score(self, delta=1):
         self.score += delta
+        if delta:
+            self.text_surface = None
 
-    def draw(self, screen):
-        text_surface = self.font.render(f'{self.score}', True, (192, 0, 0))
-        screen.blit(text_surface, self.position)
+    def reset(self):
+        self.score = 0
+        self.text_surface = None
+
+    def get_surface(self):
+        if self.text_surface is None:  # only re-render when the score changes
+            self.text_surface = self.font.render(f'{self.score}', True, (192, 0, 0))
+        return self.text_surface
+
+    def draw(self, renderer):
+        return renderer.blit(self.get_surface(), self.position)
 
 
 class Bullet:
+    sprites = dict()  # one shared sprite and collision mask per (color, size)
+    masks = dict()
+
     def __init__(self, position, normalized_velocity, color=(0, 192, 0), size=5, speed=10):
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.reset(position, normalized_velocity, color=color, size=size, speed=speed)
+
+    def reset(self, position, normalized_velocity, color=(0, 192, 0), size=5, speed=10):
         self.life_counter = 120  # in frames
         self.color = color
         self.size = size
         self.speed = speed
         self.sprite = self.init_sprite()
-        self.position = position
-        self.rect = self.sprite.get_rect(center=self.position)
+        self.mask = self.masks[(color, size)]
+        self.position = pygame.Vector2(position)
+        self.rect.size = self.sprite.get_size()
+        self.rect.center = position
         self.normalized_velocity = normalized_velocity
 
     def init_sprite(self):
-        size = self.size
-        surface = pygame.Surface((size, size))
-        pygame.draw.circle(surface, self.color, (size / 2, size / 2), size // 2)
-        return surface
+        key = (self.color, self.size)
+        if key not in self.sprites:
+            size = self.size
+            surface = pygame.Surface((size, size))
+            pygame.draw.circle(surface, self.color, (size / 2, size / 2), size // 2)
+            self.sprites[key] = convert_sprite(surface)
+            self.masks[key] = pygame.mask.from_threshold(surface, self.color, (1, 1, 1, 255))
+        return self.sprites[key]
 
     def update_position(self):
-        position = self.position + self.normalized_velocity * self.speed
-        position = wrap_coordinates(position)
-        self.position = position
-        self.rect.center = position
+        move_in_place(self.position, self.normalized_velocity, self.speed)
+        self.rect.center = self.position
 
-    def draw(self, screen):
-        screen.blit(self.sprite, self.rect)
+    def draw(self, renderer, alpha=1):
+        return renderer.blit(self.sprite, interpolate_rect(self.rect, self.normalized_velocity, self.speed, alpha))
 
     def is_exhausted(self):
         self.life_counter -= 1
@@ -124,33 +887,53 @@ class Bullet:
             return False
 
 
+class BulletPool:
+    # recycles bullets through a free list so steady-state shooting allocates no new objects
+    def __init__(self, bullet_factory=Bullet):
+        self.bullet_factory = bullet_factory
+        self.free_bullets = []
+
+    def acquire(self, position, normalized_velocity, **kwargs):
+        if self.free_bullets:
+            bullet = self.free_bullets.pop()
+            bullet.reset(position, normalized_velocity, **kwargs)
+            return bullet
+        return self.bullet_factory(position, normalized_velocity, **kwargs)
+
+    def release(self, bullet):
+        self.free_bullets.append(bullet)
+
+
 class Asteroid:
-    def __init__(self, position=None, size=None):
+    def __init__(self, position=None, size=None, shape_cache=None, rng=random, shape_key=None):
+        self.shape_cache = shape_cache
+        self.shape_key = None
+        self.rng = rng
         if position is not None:
-            self.position = position
+            self.position = pygame.Vector2(position)
         else:
-            self.position = get_random_position()
-        self.size = size
-        self.sprite = self.init_sprite()
+            self.position = get_random_position(rng)
+        self.sprite = self.init_sprite(size, shape_key)
         self.rect = self.sprite.get_rect(center=self.position)
         self.normalized_velocity = self.get_random_velocity()
-        self.speed = random.random() * 4.5 + 0.5
+        self.speed = rng.random() * 4.5 + 0.5
         # print(self.normalized_velocity, self.speed)
 
     def get_random_velocity(self):
         velocity = (
-            2 * random.random() - 1,
-            2 * random.random() - 1,
+            2 * self.rng.random() - 1,
+            2 * self.rng.random() - 1,
         )
         velocity = pygame.Vector2(velocity).normalize()
         return velocity
 
-    def get_random_polygon(self, min_radius, max_radius, min_points=7, max_points=16, angle_step=5):
-        num_points = random.randint(min_points, max_points)
-        angles = sorted(random.sample(range(0, 360, angle_step), num_points))
+    @staticmethod
+    def get_random_polygon(min_radius, max_radius, min_points=7, max_points=16, angle_step=5, rng=random):
+        num_points = rng.randint(min_points, max_points)
+        angles = sorted(rng.sample(range(0, 360, angle_step), num_points))
         points = []
         for angle in angles:
-            radius = random.uniform(min_radius, max_radius)
+            radius = rng.uniform(min_radius, max_radius)
             x = math.cos(math.radians(angle)) * radius + max_radius
             y = math.sin(math.radians(angle)) * radius + max_radius
             points.append((x, y))
@@ -159,40 +942,129 @@ class Asteroid:
         points = [(p[0] - min_x, p[1] - min_y) for p in points]
         return points
 
-    def init_sprite(self):
-        if self.size is None:
-            self.size = int(random.uniform(15, 90))
-        radius = self.size / 2
-        points = self.get_random_polygon(radius * 0.9, radius - 1)
+    @staticmethod
+    def draw_shape(size, rng=random):
+        radius = size / 2
+        points = Asteroid.get_random_polygon(radius * 0.9, radius - 1, rng=rng)
         max_x = max(p[0] for p in points)
         max_y = max(p[1] for p in points)
         surface = pygame.Surface((int(max_x + 1), int(max_y + 1)))  # adjust bounding rect
-        self.size = max(max_x, max_y)
         color = (255, 255, 255)
+        # the collision mask covers the whole rock, not just its outline
+        pygame.draw.polygon(surface, color, points)
+        mask = pygame.mask.from_threshold(surface, color, (1, 1, 1, 255))
+        surface.fill((0, 0, 0))
         pygame.draw.polygon(surface, color, points, width=1)
         surface.set_colorkey((0, 0, 0))
+        return convert_sprite(surface), max(max_x, max_y), mask
+
+    def init_sprite(self, size=None, shape_key=None):
+        if shape_key is None:
+            if size is None:
+                size = int(self.rng.uniform(15, 90))
+            if self.shape_cache is None:
+                surface, self.size, self.mask = self.draw_shape(size, rng=self.rng)
+                return surface
+            shape_key = self.shape_cache.get_key(size, self.rng.randrange(self.shape_cache.num_variants))
+        self.shape_key = shape_key
+        surface, self.size, self.mask = self.shape_cache.get_shape(shape_key)
         return surface
 
     def update_position(self):
-        position = self.position + self.normalized_velocity * self.speed
-        position = wrap_coordinates(position)
-        self.position = position
-        self.rect.center = position
-
-    def draw(self, screen):
-        screen.blit(self.sprite, self.rect)
+        move_in_place(self.position, self.normalized_velocity, self.speed)
+        self.rect.center = self.position
+
+    def draw(self, renderer, alpha=1):
+        return renderer.blit(self.sprite, interpolate_rect(self.rect, self.normalized_velocity, self.speed, alpha))
+
+
+class AsteroidShapeCache:
+    # shared asteroid sprites keyed by (size bucket, variant); every key always yields the same
+    # silhouette, so evicted shapes can be redrawn identically on the next request
+    def __init__(self, num_variants=8, bucket_size=5, max_bytes=4 * 1024 * 1024):
+        self.num_variants = num_variants
+        self.bucket_size = bucket_size
+        self.max_bytes = max_bytes
+        self.num_bytes = 0
+        self.shapes = OrderedDict()
+
+    def get_key(self, size, variant):
+        return max(1, round(size / self.bucket_size)), variant
+
+    def get_shape(self, key):
+        if key in self.shapes:
+            self.shapes.move_to_end(key)
+            return self.shapes[key]
+        bucket, variant = key
+        shape = Asteroid.draw_shape(bucket * self.bucket_size, rng=random.Random(bucket * self.num_variants + variant))
+        self.shapes[key] = shape
+        self.num_bytes += self.get_num_bytes(shape)
+        while self.num_bytes > self.max_bytes and len(self.shapes) > 1:
+            _, evicted_shape = self.shapes.popitem(last=False)
+            self.num_bytes -= self.get_num_bytes(evicted_shape)
+        return shape
+
+    def get_num_bytes(self, shape):
+        surface, _, _ = shape
+        num_pixels = surface.get_width() * surface.get_height()
+        return num_pixels * surface.get_bytesize() + num_pixels // 8  # sprite plus its bit mask
+
+    def preload(self, min_size=15, max_size=90):
+        min_bucket, _ = self.get_key(min_size, 0)
+        max_bucket, _ = self.get_key(max_size, 0)
+        for bucket in range(min_bucket, max_bucket + 1):
+            for variant in range(self.num_variants):
+                self.get_shape((bucket, variant))
+
+
+class RotationAtlas:
+    # pre-rotated copies of a sprite for every multiple of angle_step, so drawing never rotates;
+    # mask_sprite, if given, is rotated the same way to provide a collision mask per orientation
+    def __init__(self, sprite, angle_step, mask_sprite=None):
+        self.angle_step = angle_step
+        num_orientations = round(360 / angle_step)
+        self.sprites = [pygame.transform.rotate(sprite, i * angle_step) for i in range(num_orientations)]
+        self.sizes = [rotated_sprite.get_size() for rotated_sprite in self.sprites]
+        self.masks = None
+        if mask_sprite is not None:
+            self.masks = [
+                pygame.mask.from_surface(pygame.transform.rotate(mask_sprite, i * angle_step))
+                for i in range(num_orientations)
+            ]
+
+    def get_index(self, angle):
+        return round(angle / self.angle_step) % len(self.sprites)
+
+    def get_sprite(self, angle):
+        return self.sprites[self.get_index(angle)]
+
+    def get_size(self, angle):
+        return self.sizes[self.get_index(angle)]
+
+    def get_mask(self, angle):
+        return self.masks[self.get_index(angle)]
 
 
 class PlayerSpaceship:
+    ANGULAR_VELOCITY = 4.5
+    rotation_atlas = None  # shared by all ships, built on first use
+
     def __init__(self, position):
         self.sprite = self.init_sprite()
+        if PlayerSpaceship.rotation_atlas is None:
+            PlayerSpaceship.rotation_atlas = RotationAtlas(
+                self.sprite, self.ANGULAR_VELOCITY, mask_sprite=self.init_sprite(width=0))
+        self.rotated_sprite = self.sprite
+        self.mask = self.rotation_atlas.get_mask(0)
         self.rect = self.sprite.get_rect(center=position)
         self.orientation = 0
+        self.previous_center = self.rect.center  # state before the last tick, for render interpolation
+        self.previous_orientation = 0
         self.normalized_velocity = pygame.Vector2(0, -1)
         self.speed = 0
         self.is_dead = False
 
-    def init_sprite(self):
+    def init_sprite(self, width=1):
         w, h = 30, 45
         surface = pygame.Surface((w, h))
         color = (255, 255, 255)
@@ -201,9 +1073,9 @@ class PlayerSpaceship:
             (0, h - 1),
             (w - 1, h - 1)
         ]
-        pygame.draw.polygon(surface, color, triangle_points, width=1)
+        pygame.draw.polygon(surface, color, triangle_points, width=width)
         surface.set_colorkey((0, 0, 0))
-        return surface
+        return convert_sprite(surface)
 
     def get_position(self):
         return self.rect.center
@@ -214,8 +1086,8 @@ class PlayerSpaceship:
         return position, normalized_velocity
 
     def update_orientation(self, rotation_direction):
-        angular_velocity = 4.5
-        self.orientation = (self.orientation + (rotation_direction * angular_velocity)) % 360
+        self.previous_orientation = self.orientation
+        self.orientation = (self.orientation + (rotation_direction * self.ANGULAR_VELOCITY)) % 360
 
     def update_position(self, is_accelerating):
         max_speed = 7
@@ -223,6 +1095,7 @@ class PlayerSpaceship:
             a = pygame.Vector2(0, -1).rotate(-self.orientation)
         else:
             a = (0, 0)
+        self.previous_center = self.rect.center
         velocity = (self.normalized_velocity * self.speed) + a
         self.speed = min(velocity.magnitude(), max_speed)
         if self.speed > 0:
@@ -230,27 +1103,41 @@ class PlayerSpaceship:
         self.rect.center = (self.rect.center + self.normalized_velocity * self.speed)
         self.rect.center = wrap_coordinates(self.rect.center)
 
-    def draw(self, screen):
-        rotated = pygame.transform.rotate(self.sprite, self.orientation)
-        self.rect = rotated.get_rect(center=self.rect.center)
-        screen.blit(rotated, self.rect)
+    def update_sprite(self):
+        center = self.rect.center
+        self.rotated_sprite = self.rotation_atlas.get_sprite(self.orientation)
+        self.mask = self.rotation_atlas.get_mask(self.orientation)
+        self.rect.size = self.rotation_atlas.get_size(self.orientation)
+        self.rect.center = center
+
+    def draw(self, renderer, alpha=1):
+        if alpha >= 1:
+            return renderer.blit_rotated(self.sprite, self.orientation, self.rect.center, self.rotated_sprite)
+        (previous_x, previous_y), (x, y) = self.previous_center, self.rect.center
+        if abs(x - previous_x) > DISPLAY_PARAMS.width / 2 or abs(y - previous_y) > DISPLAY_PARAMS.height / 2:
+            previous_x, previous_y = x, y  # wrapped around the screen edge, don't sweep across it
+        center = (previous_x + (x - previous_x) * alpha, previous_y + (y - previous_y) * alpha)
+        turn = (self.orientation - self.previous_orientation + 180) % 360 - 180
+        orientation = (self.previous_orientation + turn * alpha) % 360
+        return renderer.blit_rotated(self.sprite, orientation, center, self.rotation_atlas.get_sprite(orientation))
 
 
 class Debris:
     SPEED = 1
     ROTATION_SPEED = 1
 
-    def __init__(self, initial_position, num_pieces=6, size=20):
+    def __init__(self, initial_position, num_pieces=6, size=20, rng=random):
         self.num_pieces = num_pieces
         self.initial_position = pygame.Vector2(initial_position)
+        self.rng = rng
         self.pieces = self.generate_pieces()
         self.size = size
 
     def generate_pieces(self):
         pieces = []
         for _ in range(self.num_pieces):
-            orientation = random.random() * 360
-            velocity = pygame.Vector2(0, -1).rotate(-random.random() * 360)
+            orientation = self.rng.random() * 360
+            velocity = pygame.Vector2(0, -1).rotate(-self.rng.random() * 360)
             pieces.append(dict(position=self.initial_position, orientation=orientation, velocity=velocity))
         return pieces
 
@@ -259,21 +1146,105 @@ class Debris:
             piece['position'] = piece['position'] + piece['velocity'] * self.SPEED
             piece['orientation'] = (piece['orientation'] + self.ROTATION_SPEED) % 360
 
-    def draw(self, screen):
+    def get_segments(self, alpha=1):
+        segments = []
         for piece in self.pieces:
-            segment = pygame.Vector2(0, -1).rotate(-piece['orientation']) * self.size / 2
-            pygame.draw.line(screen, (255, 255, 255), piece['position'] + segment, piece['position'] - segment)
+            position = piece['position'] - piece['velocity'] * self.SPEED * (1 - alpha)
+            orientation = piece['orientation'] - self.ROTATION_SPEED * (1 - alpha)
+            segment = pygame.Vector2(0, -1).rotate(-orientation) * self.size / 2
+            segments.append(((255, 255, 255), position + segment, position - segment))
+        return segments
+
+    def draw(self, renderer, alpha=1):
+        return [renderer.draw_line(color, start, end) for color, start, end in self.get_segments(alpha)]
+
+
+class ParticleSystem:
+    # structure-of-arrays particle buffer of fixed size, updated in one vectorized pass per tick; once it is
+    # full, new particles overwrite the oldest slots instead of growing it
+    def __init__(self, capacity=4096, seed=None):
+        self.capacity = capacity
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.orientations = np.zeros(capacity)  # in degrees
+        self.angular_velocities = np.zeros(capacity)
+        self.sizes = np.zeros(capacity)
+        self.lives = np.zeros(capacity, dtype=np.int32)  # in ticks, 0 for free slots
+        self.alive_mask = np.zeros(capacity, dtype=bool)  # scratch buffer, so updates allocate nothing
+        self.colors = np.zeros((capacity, 3), dtype=np.uint8)
+        self.next_slot = 0
+        self.rng = np.random.default_rng(seed)  # particles are cosmetic and must not draw from the game RNG
+
+    def reset(self, seed=None):
+        self.lives[:] = 0
+        self.next_slot = 0
+        self.rng = np.random.default_rng(seed)
+
+    def get_num_alive(self):
+        return int(np.count_nonzero(self.lives))
+
+    def emit(self, position, num_particles, speed_range, life_range, size_range, color, max_angular_speed=2):
+        num_particles = min(num_particles, self.capacity)
+        slots = np.arange(self.next_slot, self.next_slot + num_particles) % self.capacity
+        self.next_slot = (self.next_slot + num_particles) % self.capacity
+        rng = self.rng
+        angles = rng.uniform(0, 2 * np.pi, num_particles)
+        speeds = rng.uniform(*speed_range, num_particles)
+        self.positions[slots] = position
+        self.velocities[slots, 0] = np.cos(angles) * speeds
+        self.velocities[slots, 1] = np.sin(angles) * speeds
+        self.orientations[slots] = rng.uniform(0, 360, num_particles)
+        self.angular_velocities[slots] = rng.uniform(-max_angular_speed, max_angular_speed, num_particles)
+        self.sizes[slots] = rng.uniform(*size_range, num_particles)
+        self.lives[slots] = rng.integers(*life_range, num_particles, endpoint=True)
+        self.colors[slots] = color
+
+    def emit_asteroid_explosion(self, position, size):
+        self.emit(position, int(size // 3), (0.5, 2.5), (20, 50), (1, 4), (255, 255, 255))
+
+    def emit_saucer_explosion(self, position):
+        self.emit(position, 40, (1, 4), (20, 60), (2, 6), (192, 0, 0))
+
+    def emit_ship_explosion(self, position):
+        # the hull breaks into a few slow, long-lived pieces, plus a burst of short sparks
+        self.emit(position, 6, (1, 1), (600, 600), (10, 10), (255, 255, 255), max_angular_speed=1)
+        self.emit(position, 30, (1, 3), (15, 40), (1, 3), (255, 192, 0))
+
+    def update(self):
+        # dead slots move too; touching the whole buffer keeps the cost flat and avoids fancy indexing
+        self.positions += self.velocities
+        self.orientations += self.angular_velocities
+        np.greater(self.lives, 0, out=self.alive_mask)
+        np.subtract(self.lives, 1, out=self.lives, where=self.alive_mask)
+
+    def get_segments(self, alpha=1):
+        alive = np.flatnonzero(self.lives)
+        if not len(alive):
+            return []
+        backtrack = 1 - alpha
+        positions = self.positions[alive] - self.velocities[alive] * backtrack
+        angles = np.radians(self.orientations[alive] - self.angular_velocities[alive] * backtrack)
+        segments = np.stack([np.sin(angles), np.cos(angles)], axis=1) * self.sizes[alive, np.newaxis]
+        return list(zip(self.colors[alive].tolist(), (positions + segments).tolist(), (positions - segments).tolist()))
+
+    def draw(self, renderer, alpha=1):
+        return [renderer.draw_line(color, start, end) for color, start, end in self.get_segments(alpha)]
 
 
 class EnemySaucer:
-    def __init__(self, position):
+    mask = None  # shared by all saucers, built on first use
+
+    def __init__(self, position, rng=random):
+        self.rng = rng
         self.sprite = self.init_sprite()
-        self.position = position
+        if EnemySaucer.mask is None:
+            EnemySaucer.mask = pygame.mask.from_surface(self.init_sprite(width=0))
+        self.position = pygame.Vector2(position)
         self.rect = self.sprite.get_rect(center=position)
         self.normalized_velocity = pygame.Vector2(1, 0)
         self.speed = 3
 
-    def init_sprite(self):
+    def init_sprite(self, width=1):
         w, h = 60, 30
         surface = pygame.Surface((w, h))
         color = (192, 0, 0)
@@ -296,99 +1267,656 @@ class EnemySaucer:
             (w - 1 - 0.4 * w, 0),
             (w - 1 - 0.3 * w, (1 / 3) * h),
         ]
-        pygame.draw.polygon(surface, color, bottom_points, width=1)
-        pygame.draw.polygon(surface, color, middle_points, width=1)
-        pygame.draw.polygon(surface, color, top_points, width=1)
+        pygame.draw.polygon(surface, color, bottom_points, width=width)
+        pygame.draw.polygon(surface, color, middle_points, width=width)
+        pygame.draw.polygon(surface, color, top_points, width=width)
         surface.set_colorkey((0, 0, 0))
-        return surface
+        return convert_sprite(surface)
 
     def get_position(self):
         return self.rect.center
 
     def maybe_shoot(self, target_position):
-        if random.random() > 0.01:
+        if self.rng.random() > 0.01:
             return None
         position = pygame.Vector2(self.rect.center)
         normalized_velocity = (target_position - position).normalize()
         return position, normalized_velocity
 
     def get_new_bullet_params(self):
-        normalized_velocity = get_random_velocity()
+        normalized_velocity = get_random_velocity(self.rng)
         position = self.rect.center + normalized_velocity * 50
         return position, normalized_velocity
 
     def update_position(self):
-        if random.random() < 0.015:  # randomly change direction
-            self.normalized_velocity = get_random_velocity()
-        position = self.position + self.normalized_velocity * self.speed
-        position = wrap_coordinates(position)
-        self.position = position
-        self.rect.center = position
+        if self.rng.random() < 0.015:  # randomly change direction
+            self.normalized_velocity = get_random_velocity(self.rng)
+        move_in_place(self.position, self.normalized_velocity, self.speed)
+        self.rect.center = self.position
 
-    def draw(self, screen):
+    def draw(self, renderer, alpha=1):
         self.rect = self.sprite.get_rect(center=self.rect.center)
-        screen.blit(self.sprite, self.rect)
+        return renderer.blit(self.sprite, interpolate_rect(self.rect, self.normalized_velocity, self.speed, alpha))
+
+
+class EntityStore:
+    # structure-of-arrays storage for many moving entities, integrated in one vectorized pass per tick
+    def __init__(self, capacity=256):
+        if np is None:
+            raise RuntimeError('The entity store requires numpy')
+        self.positions = np.zeros((capacity, 2))
+        self.normalized_velocities = np.zeros((capacity, 2))
+        self.speeds = np.zeros(capacity)
+        self.sizes = np.zeros(capacity)
+        self.life_counters = np.zeros(capacity, dtype=np.int64)
+        self.rect_sizes = np.zeros((capacity, 2), dtype=np.int64)
+        self.free_slots = list(range(capacity - 1, -1, -1))
+
+    def get_capacity(self):
+        return len(self.speeds)
+
+    def grow(self):
+        capacity = self.get_capacity()
+        for name in ['positions', 'normalized_velocities', 'speeds', 'sizes', 'life_counters', 'rect_sizes']:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.zeros_like(array)]))
+        self.free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def allocate(self):
+        if not self.free_slots:
+            self.grow()
+        return self.free_slots.pop()
+
+    def release(self, slot):
+        self.speeds[slot] = 0
+        self.free_slots.append(slot)
+
+    def update_positions(self):
+        # same arithmetic as update_position() + wrap_coordinates(), applied to every slot at once
+        self.positions += self.normalized_velocities * self.speeds[:, None]
+        for axis, extent in enumerate([DISPLAY_PARAMS.width, DISPLAY_PARAMS.height]):
+            coordinates = self.positions[:, axis]
+            is_below = coordinates < 0
+            is_above = coordinates >= extent
+            coordinates[is_below] += extent
+            coordinates[is_above] -= extent
+
+    def update_life_counters(self):
+        self.life_counters -= 1
+
+    def get_rects(self, entities):
+        # (left, top) and (width, height) arrays of the entities' rects, centered on their positions the way
+        # pygame.Rect rounds centers (half away from zero), without touching the entities' rects
+        slots = np.fromiter((entity.slot for entity in entities), dtype=np.int64, count=len(entities))
+        sizes = self.rect_sizes[slots]
+        centers = self.positions[slots]
+        centers = np.trunc(centers + np.copysign(0.5, centers)).astype(np.int64)
+        return slots, centers - sizes // 2, sizes
+
+    def get_blits(self, entities, alpha=1):
+        # (sprite, position) pairs drawing the entities like interpolate_rect() would, for Renderer.blits()
+        slots, topleft, _ = self.get_rects(entities)
+        if alpha < 1:
+            backtrack = (1 - alpha) * self.speeds[slots]
+            topleft += np.round(-self.normalized_velocities[slots] * backtrack[:, None]).astype(np.int64)
+        return list(zip([entity.sprite for entity in entities], topleft.tolist()))
+
+
+class StoreField:
+    # reads return copies (a new Vector2 for vector fields): to change a stored value, assign the whole
+    # attribute, e.g. asteroid.position = asteroid.position + offset; asteroid.position.x += 1 changes nothing
+    def __init__(self, array_name, is_vector=False):
+        self.array_name = array_name
+        self.is_vector = is_vector
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        value = getattr(entity.store, self.array_name)[entity.slot].tolist()
+        return pygame.Vector2(value) if self.is_vector else value
+
+    def __set__(self, entity, value):
+        getattr(entity.store, self.array_name)[entity.slot] = value
+
+
+class StoredEntity:
+    # mixin turning an entity's kinematic attributes into views onto an EntityStore slot
+    position = StoreField('positions', is_vector=True)
+    normalized_velocity = StoreField('normalized_velocities', is_vector=True)
+    speed = StoreField('speeds')
+    size = StoreField('sizes')
+
+    def __init__(self, store, *args, **kwargs):
+        self.store = store
+        self.slot = store.allocate()
+        super().__init__(*args, **kwargs)
+
+    @property
+    def rect(self):
+        # the store moves entities without touching their rects, so re-center on access
+        self._rect.center = self.store.positions[self.slot].tolist()
+        return self._rect
+
+    @rect.setter
+    def rect(self, rect):
+        self._rect = rect
+        self.store.rect_sizes[self.slot] = rect.size
+
+    def update_position(self):
+        # position reads are copies, so the moved copy is written back
+        self.position = move_in_place(self.position, self.normalized_velocity, self.speed)
+
+    def release(self):
+        self.store.release(self.slot)
+
+
+class StoredAsteroid(StoredEntity, Asteroid):
+    pass
+
+
+class StoredBullet(StoredEntity, Bullet):
+    life_counter = StoreField('life_counters')
+
+    def reset(self, *args, **kwargs):
+        super().reset(*args, **kwargs)
+        self.store.rect_sizes[self.slot] = self._rect.size  # Bullet.reset() resizes the rect in place
+
+    def is_exhausted(self):
+        # life counters are decremented for the whole store by EntityStore.update_life_counters()
+        return self.life_counter <= 0
+
+
+class AutomaticCollector:
+    # leaves garbage collection to Python's thresholds
+    def start(self):
+        pass
+
+    def collect(self):
+        pass
+
+    def maybe_collect(self):
+        pass
+
+    def stop(self):
+        pass
+
+
+class ManualCollector:
+    # keeps the cyclic garbage collector from pausing gameplay at random moments: everything alive once the game
+    # has started (assets, caches, pools) is frozen out of collection, automatic collection is turned off, and
+    # the game collects where a pause goes unnoticed, i.e. on a new asteroid wave, on game over and on restart
+    MAX_PENDING_OBJECTS = 100000  # safety net for long waves that keep creating reference cycles
+
+    def __init__(self):
+        self.was_enabled = True
+
+    def start(self):
+        self.was_enabled = gc.isenabled()
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+
+    def collect(self):
+        gc.collect()
+
+    def maybe_collect(self):
+        if gc.get_count()[0] > self.MAX_PENDING_OBJECTS:
+            gc.collect()
+
+    def stop(self):
+        gc.unfreeze()
+        if self.was_enabled:
+            gc.enable()
+
+
+# what one frame draws, captured by the simulation: (sprite, position) blits and (color, start, end) lines
+FrameSnapshot = namedtuple('FrameSnapshot', ['num_ticks', 'game_state', 'blits', 'segments'])
+
+
+class FrameProfiler:
+    PHASES = [
+        'input', '_generate_bullets', '_update_positions', '_process_collisions', '_spawn', '_update_particles',
+        'draw_frame', 'capture', 'display_flush',
+    ]
+    ENTITY_COUNTS = ['asteroids', 'player_bullets', 'saucer_bullets', 'saucers', 'particles']
+    GRAPH_SIZE = (300, 80)
+    GRAPH_MAX_MS = 50
+
+    ALLOCATION_COUNTS = ['alloc_bytes', 'alloc_blocks', 'alloc_objects', 'gc_collections', 'gc_ms']
+
+    def __init__(self, max_frames=3600, track_allocations=False):
+        self.frames = deque(maxlen=max_frames)
+        self.is_overlay_visible = False
+        self.current_frame = None
+        self.last_mark_time = 0
+        # with track_allocations, each phase is also charged the peak number of bytes it had allocated on top of
+        # what was live when it started (tracemalloc), the net number of memory blocks it left allocated and the
+        # net number of objects it added to the youngest gc generation (gc.get_count), and each frame counts the
+        # garbage collections that ran in it and how long they took. None of these see a temporary that is freed
+        # before the phase ends, so hot paths must not rely on them to prove they do not allocate
+        self.track_allocations = track_allocations
+        self.last_mark_memory = 0
+        self.last_mark_blocks = 0
+        self.last_mark_objects = 0
+        self.gc_start_time = None
+        self.gc_start_objects = 0
+        if track_allocations:
+            tracemalloc.start()
+            gc.callbacks.append(self.on_gc)
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self.gc_start_time = time.perf_counter()
+            self.gc_start_objects = gc.get_count()[0]
+        else:
+            # a collection resets the youngest generation's count, so the current phase keeps what it had added
+            self.last_mark_objects -= self.gc_start_objects - gc.get_count()[0]
+            if self.current_frame is not None and self.gc_start_time is not None:
+                self.current_frame['gc_collections'] += 1
+                self.current_frame['gc_ms'] += (time.perf_counter() - self.gc_start_time) * 1000
+                self.gc_start_time = None
+
+    def begin_frame(self):
+        self.current_frame = dict.fromkeys(self.PHASES, 0.0)
+        if self.track_allocations:
+            self.current_frame.update(dict.fromkeys(self.get_allocation_keys(), 0))
+            self.current_frame['gc_ms'] = 0.0
+            tracemalloc.reset_peak()
+            self.last_mark_memory = tracemalloc.get_traced_memory()[0]
+            self.last_mark_blocks = sys.getallocatedblocks()
+            self.last_mark_objects = gc.get_count()[0]
+        self.last_mark_time = time.perf_counter()
+
+    def mark(self, phase):
+        # charges the time since the previous mark to the given phase
+        now = time.perf_counter()
+        self.current_frame[phase] += (now - self.last_mark_time) * 1000
+        if self.track_allocations:
+            memory, peak_memory = tracemalloc.get_traced_memory()
+            blocks = sys.getallocatedblocks()
+            objects = gc.get_count()[0]
+            self.current_frame[f'{phase}_bytes'] += peak_memory - self.last_mark_memory
+            self.current_frame[f'{phase}_blocks'] += blocks - self.last_mark_blocks
+            self.current_frame[f'{phase}_objects'] += objects - self.last_mark_objects
+            tracemalloc.reset_peak()
+            self.last_mark_memory = memory
+            self.last_mark_blocks = blocks
+            self.last_mark_objects = objects
+        self.last_mark_time = time.perf_counter()
+
+    def end_frame(self, get_entity_counts):
+        # entity counts are only gathered for frames that are being profiled
+        frame = self.current_frame
+        frame['frame'] = sum(frame[phase] for phase in self.PHASES)
+        if self.track_allocations:
+            frame['alloc_bytes'] = sum(frame[f'{phase}_bytes'] for phase in self.PHASES)
+            frame['alloc_blocks'] = sum(frame[f'{phase}_blocks'] for phase in self.PHASES)
+            frame['alloc_objects'] = sum(frame[f'{phase}_objects'] for phase in self.PHASES)
+        frame.update(get_entity_counts())
+        self.frames.append(frame)
+
+    def get_allocation_keys(self):
+        if not self.track_allocations:
+            return []
+        return self.ALLOCATION_COUNTS + [
+            f'{phase}_{unit}' for unit in ['bytes', 'blocks', 'objects'] for phase in self.PHASES]
+
+    def stop(self):
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+            tracemalloc.stop()
+
+    def get_percentiles(self, key='frame', percentiles=(50, 95, 99)):
+        values = sorted(frame[key] for frame in self.frames)
+        if not values:
+            return dict.fromkeys(percentiles, 0.0)
+        return {p: values[min(len(values) - 1, len(values) * p // 100)] for p in percentiles}
+
+    def draw_overlay(self, renderer, font):
+        percentiles = self.get_percentiles()
+        lines = ['frame ms  ' + '  '.join(f'p{p}: {value:.2f}' for p, value in percentiles.items())]
+        if self.frames:
+            last_frame = self.frames[-1]
+            lines.extend(f'{phase}: {last_frame[phase]:.2f}' for phase in self.PHASES)
+            lines.extend(f'{key}: {last_frame[key]}' for key in self.ENTITY_COUNTS)
+            if 'alloc_bytes' in last_frame:
+                lines.append(f"alloc: {last_frame['alloc_bytes']} B  {last_frame['alloc_blocks']} blocks  "
+                             f"{last_frame['alloc_objects']} objects  "
+                             f"gc: {last_frame['gc_collections']} ({last_frame['gc_ms']:.2f} ms)")
+        x, y = DISPLAY_PARAMS.width - self.GRAPH_SIZE[0] - 10, 10
+        rects = []
+        for line in lines:
+            rects.append(renderer.blit(font.render(line, True, (255, 255, 0)), (x, y)))
+            y += font.get_linesize()
+        # spike graph: one column per recent frame, with a marker at the frame budget
+        graph_rect = pygame.Rect((x, y + 5), self.GRAPH_SIZE)
+        rects.append(renderer.draw_rect((64, 64, 64), graph_rect, width=1))
+        budget_y = graph_rect.bottom - graph_rect.height * (1000 / DISPLAY_PARAMS.max_fps) / self.GRAPH_MAX_MS
+        renderer.draw_line((0, 128, 0), (graph_rect.left, budget_y), (graph_rect.right - 1, budget_y))
+        recent_frames = list(self.frames)[-graph_rect.width:]
+        for i, frame in enumerate(recent_frames):
+            height = min(frame['frame'] / self.GRAPH_MAX_MS, 1) * graph_rect.height
+            color = (255, 0, 0) if frame['frame'] > 1000 / DISPLAY_PARAMS.max_fps else (255, 255, 0)
+            column_x = graph_rect.left + i
+            renderer.draw_line(color, (column_x, graph_rect.bottom - 1), (column_x, graph_rect.bottom - height))
+        return rects
+
+    def export(self, path):
+        fields = ['frame'] + self.PHASES + self.ENTITY_COUNTS + self.get_allocation_keys()
+        path = Path(path)
+        if path.suffix == '.csv':
+            with open(path, 'w', newline='') as file:
+                writer = csv.DictWriter(file, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(self.frames)
+        else:
+            summary = {key: self.get_percentiles(key) for key in ['frame'] + self.PHASES + self.get_allocation_keys()}
+            with open(path, 'w') as file:
+                json.dump(dict(percentiles=summary, frames=list(self.frames)), file)
+
+
+class PipelinedRunner:
+    # runs the simulation on a worker thread that publishes a FrameSnapshot after every tick, while the calling
+    # thread reads input and draws the newest snapshot; pygame releases the GIL while it blits and flushes, so
+    # the two overlap. Input and frames are handed over by plain attribute assignment, which is atomic
+    MAX_INTERVALS = 3600
+
+    def __init__(self, game):
+        if isinstance(game.profiler, FrameProfiler):
+            raise ValueError('The frame profiler cannot time a pipelined game')
+        self.game = game
+        self.player_input = PlayerInput()  # written by the main thread only
+        self.frame = None  # written by the simulation thread only
+        self.is_running = False
+        self.error = None  # raised by the simulation thread, re-raised from run()
+        self.simulation_intervals = deque(maxlen=self.MAX_INTERVALS)  # (start, end) of recent busy periods
+        self.render_intervals = deque(maxlen=self.MAX_INTERVALS)
+
+    def simulate(self):
+        game = self.game
+        tick_seconds = 1 / DISPLAY_PARAMS.tick_rate
+        next_tick_time = time.perf_counter()
+        try:
+            while self.is_running:
+                delay = next_tick_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                start = time.perf_counter()
+                game.tick(self.player_input, game.get_simulation_ticks())
+                self.frame = game.capture_frame()
+                end = time.perf_counter()
+                self.simulation_intervals.append((start, end))
+                if game.game_state in [GameState.EXITED, GameState.RESTARTING]:
+                    break
+                # like the fixed timestep loop, drop the backlog when too far behind
+                next_tick_time = max(next_tick_time + tick_seconds, end - game.MAX_CATCH_UP_STEPS * tick_seconds)
+        except BaseException as error:
+            self.error = error
+        finally:
+            # also stops the drawing loop, which would otherwise keep showing the last frame
+            self.is_running = False
+
+    def run(self):
+        game = self.game
+        self.is_running = True
+        worker = threading.Thread(target=self.simulate, daemon=True)
+        game.collector.start()
+        worker.start()
+        is_exiting = False
+        last_frame = None
+        try:
+            while self.is_running:
+                player_input = game.input_source.read()
+                if player_input.is_exiting:
+                    is_exiting = True
+                    break
+                self.player_input = player_input
+                frame = self.frame
+                if frame is not last_frame:
+                    start = time.perf_counter()
+                    game.render(frame)
+                    self.render_intervals.append((start, time.perf_counter()))
+                    last_frame = frame
+                game.clock.tick()
+        finally:
+            self.is_running = False
+            worker.join()
+            game.collector.stop()
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+        if is_exiting:
+            game.game_state = GameState.EXITED
+        return game.game_state == GameState.RESTARTING
+
+    def get_overlap(self):
+        # how much of the busy time of both threads was spent concurrently
+        simulation_intervals, render_intervals = list(self.simulation_intervals), list(self.render_intervals)
+        overlap = 0
+        i = j = 0
+        while i < len(simulation_intervals) and j < len(render_intervals):
+            start = max(simulation_intervals[i][0], render_intervals[j][0])
+            end = min(simulation_intervals[i][1], render_intervals[j][1])
+            overlap += max(0, end - start)
+            if simulation_intervals[i][1] < render_intervals[j][1]:
+                i += 1
+            else:
+                j += 1
+        simulation_time = sum(end - start for start, end in simulation_intervals)
+        render_time = sum(end - start for start, end in render_intervals)
+        return dict(
+            simulation_ms=simulation_time * 1000,
+            render_ms=render_time * 1000,
+            overlap_ms=overlap * 1000,
+            overlap_ratio=overlap / min(simulation_time, render_time) if simulation_time and render_time else 0.0,
+        )
+
+
+class NullProfiler:
+    is_overlay_visible = False
+
+    def begin_frame(self):
+        pass
+
+    def mark(self, phase):
+        pass
+
+    def end_frame(self, get_entity_counts):
+        pass
+
+    def stop(self):
+        pass
 
 
 class Game:
     BULLET_COOLDOWN_MS = 300
+    CAPTION_UPDATE_INTERVAL_MS = 1000
     SAUCER_RESPAWN_COOLDOWN_MS = 15000
     NUM_SPAWNED_ASTEROIDS = 9
-
-    def __init__(self):
-        pygame.init()
+    MAX_CATCH_UP_STEPS = 5
+    REWIND_INTERVAL_TICKS = 6
+
+    def __init__(self, headless=False, input_source=None, clock=None, entity_store=False,
+                 asteroid_shape_cache=None, dirty_rects=False, seed=None, record=False, profile=False,
+                 precise_collisions=True, resources=None, fixed_timestep=None, particles=True, rewind=False,
+                 renderer='surface', track_allocations=False, gc_policy='automatic', capture=None,
+                 capture_format='zlib'):
+        self.headless = headless
+        if resources is None:
+            resources = Resources()
+        self.resources = resources
+        # headless games get no window, no audio and no frame cap
+        self.renderer = resources.get_renderer(headless, renderer)
+        self.sound_mixer = resources.get_sound_mixer(headless)
+        if input_source is None:
+            input_source = ScriptedInput(()) if headless else KeyboardInput()
+        self.input_source = input_source
+        if clock is None:
+            clock = SimulatedClock() if headless else RealtimeClock(DISPLAY_PARAMS.max_fps)
+        self.clock = clock
+        if fixed_timestep is None:
+            fixed_timestep = clock.is_realtime
+        # with a fixed timestep, each frame runs as many ticks as the wall clock has advanced; otherwise every
+        # frame is exactly one tick, which keeps simulated clocks and replays in lockstep with the simulation
+        self.fixed_timestep = fixed_timestep
+        self.tick_ms = 1000 / DISPLAY_PARAMS.tick_rate
+        self.asteroid_store = EntityStore() if entity_store else None
+        self.bullet_store = EntityStore() if entity_store else None
+        if entity_store:
+            self.bullet_pool = BulletPool(lambda *args, **kwargs: StoredBullet(self.bullet_store, *args, **kwargs))
+        else:
+            self.bullet_pool = BulletPool()
+        if asteroid_shape_cache is None:
+            asteroid_shape_cache = resources.get_asteroid_shape_cache()
+        self.asteroid_shape_cache = asteroid_shape_cache
+        self.use_dirty_rects = dirty_rects and self.renderer.supports_dirty_rects
+        self.precise_collisions = precise_collisions
+        self.record = record
+        self.rewind_buffer = RewindBuffer() if rewind else None
+        if capture_format not in ['raw', 'zlib']:
+            raise ValueError(f'Unknown capture format: {capture_format}')
+        self.frame_recorder = None
+        if capture is not None:
+            self.frame_recorder = FrameRecorder(capture, self.renderer.get_frame_surface(),
+                                                compress=capture_format == 'zlib',
+                                                is_blocking=not self.clock.is_realtime)
+        self.profiler = FrameProfiler(track_allocations=track_allocations) if profile else NullProfiler()
+        if gc_policy not in ['automatic', 'manual']:
+            raise ValueError(f'Unknown garbage collection policy: {gc_policy}')
+        self.collector = ManualCollector() if gc_policy == 'manual' else AutomaticCollector()
+        self.last_caption_time = None
+        self.drawn_rects = []
+        self.previous_drawn_rects = []
+        self.scoreboard = Scoreboard((10, 10), resources.get_font(48))
+        self.asteroid_grid = SpatialHash()
+        # without numpy, the ship falls back to Debris and other explosions leave no particles
+        self.particles = ParticleSystem() if particles and np is not None else None
+        self.rng = random.Random()
+        self.asteroids = []
+        self.player_bullets = []
+        self.saucer_bullets = []
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # starts a new game in place, keeping the window, audio, caches and pools of the previous one
+        if seed is None:
+            seed = random.randrange(2 ** 64)
+        self.seed = seed
+        self.rng.seed(seed)
+        if self.particles is not None:
+            self.particles.reset(seed)
         self.game_state = GameState.STARTING
-        pygame.display.set_caption('jetblack')
-        self.screen = pygame.display.set_mode((DISPLAY_PARAMS.width, DISPLAY_PARAMS.height))
-        self.sound_mixer = SoundMixer()
-        self.clock = pygame.time.Clock()
-        self.scoreboard = Scoreboard((10, 10))
+        self.needs_full_update = True
+        self.scoreboard.reset()
         self.player = PlayerSpaceship(pygame.Vector2(DISPLAY_PARAMS.width, DISPLAY_PARAMS.height) / 2)
         self.debris = None
-        self.player_bullets = []
+        for bullet in self.player_bullets + self.saucer_bullets:
+            self.bullet_pool.release(bullet)
+        self.player_bullets.clear()
+        self.saucer_bullets.clear()
         self.last_bullet_time = -1
+        if self.asteroid_store is not None:
+            for asteroid in self.asteroids:
+                asteroid.release()
         self.asteroids = self.spawn_asteroids(self.NUM_SPAWNED_ASTEROIDS)
         self.saucer = None
-        self.last_saucer_death_time = pygame.time.get_ticks()
-        self.saucer_bullets = []
+        self.last_saucer_death_time = self.clock.get_ticks()
+        self.replay = Replay(seed, self.last_saucer_death_time) if self.record else None
+        if self.rewind_buffer is not None:
+            self.rewind_buffer.clear()
+        self.start_ticks = self.last_saucer_death_time
+        self.num_ticks = 0
+        self.last_frame_ticks = self.start_ticks
+        self.accumulated_ms = 0
+        self.alpha = 1
 
     def spawn_asteroids(self, num_asteroids):
         positions = self.get_valid_spawn_positions(num_asteroids)
-        return [Asteroid(position) for position in positions]
+        return [self.new_asteroid(position) for position in positions]
+
+    def new_asteroid(self, position=None, size=None, shape_key=None, rng=None):
+        if rng is None:
+            rng = self.rng
+        if self.asteroid_store is not None:
+            return StoredAsteroid(self.asteroid_store, position=position, size=size,
+                                  shape_cache=self.asteroid_shape_cache, rng=rng, shape_key=shape_key)
+        return Asteroid(position=position, size=size, shape_cache=self.asteroid_shape_cache, rng=rng,
+                        shape_key=shape_key)
+
+    def new_bullet(self, position, normalized_velocity, **kwargs):
+        return self.bullet_pool.acquire(position, normalized_velocity, **kwargs)
+
+    def new_saucer(self, position):
+        return EnemySaucer(position, rng=self.rng)
 
     def get_valid_spawn_positions(self, num_positions, min_distance=200):
-        new_positions = []
-        tabu_positions = [pygame.Vector2(self.player.get_position())]
-        while len(new_positions) < num_positions:
-            candidate_pos = get_random_position()
-            if all(candidate_pos.distance_to(tabu_pos) >= min_distance for tabu_pos in tabu_positions):
-                tabu_positions.append(candidate_pos)
-                new_positions.append(candidate_pos)
-        return new_positions
+        sampler = PoissonDiskSampler(min_distance, rng=self.rng)
+        return sampler.sample(num_positions, tabu_positions=self.get_ship_positions())
 
-    def get_rotation_direction(self, pressed_keys):
-        if pressed_keys[pygame.K_a]:
-            return 1  # counter-clockwise
-        elif pressed_keys[pygame.K_d]:
-            return -1
-        else:
-            return 0
+    def get_ship_positions(self):
+        return [self.player.get_position()]
 
-    def draw_frame(self):
-        self.screen.fill(DISPLAY_PARAMS.bg_color)
-        for asteroid in self.asteroids:
-            asteroid.draw(self.screen)
+    def draw_frame(self, alpha=1):
+        if self.use_dirty_rects:
+            # only clear what was drawn last frame instead of the whole screen
+            for rect in self.drawn_rects:
+                self.renderer.fill(DISPLAY_PARAMS.bg_color, rect)
+        else:
+            self.renderer.fill(DISPLAY_PARAMS.bg_color)
+        self.previous_drawn_rects, self.drawn_rects = self.drawn_rects, self.previous_drawn_rects
+        drawn_rects = self.drawn_rects
+        drawn_rects.clear()
+        if self.asteroid_store is not None:
+            drawn_rects.extend(self.renderer.blits(self.asteroid_store.get_blits(self.asteroids, alpha)))
+        else:
+            for asteroid in self.asteroids:
+                drawn_rects.append(asteroid.draw(self.renderer, alpha))
         if self.saucer is not None:
-            self.saucer.draw(self.screen)
+            drawn_rects.append(self.saucer.draw(self.renderer, alpha))
         if not self.player.is_dead:
-            self.player.draw(self.screen)
+            drawn_rects.append(self.player.draw(self.renderer, alpha))
         if self.debris is not None:
-            self.debris.draw(self.screen)
+            drawn_rects.extend(self.debris.draw(self.renderer, alpha))
+        if self.particles is not None:
+            drawn_rects.extend(self.particles.draw(self.renderer, alpha))
+        for bullet in self.player_bullets:
+            drawn_rects.append(bullet.draw(self.renderer, alpha))
+        for bullet in self.saucer_bullets:
+            drawn_rects.append(bullet.draw(self.renderer, alpha))
+        drawn_rects.append(self.scoreboard.draw(self.renderer))
+
+    def capture_frame(self):
+        # sprites are shared rather than copied; they are never modified once created
+        if self.asteroid_store is not None:
+            blits = self.asteroid_store.get_blits(self.asteroids)
+        else:
+            blits = [(asteroid.sprite, asteroid.rect.topleft) for asteroid in self.asteroids]
+        if self.saucer is not None:
+            blits.append((self.saucer.sprite, self.saucer.rect.topleft))
+        if not self.player.is_dead:
+            blits.append((self.player.rotated_sprite, self.player.rect.topleft))
         for bullet in self.player_bullets:
-            bullet.draw(self.screen)
+            blits.append((bullet.sprite, bullet.rect.topleft))
         for bullet in self.saucer_bullets:
-            bullet.draw(self.screen)
-        self.scoreboard.draw(self.screen)
+            blits.append((bullet.sprite, bullet.rect.topleft))
+        blits.append((self.scoreboard.get_surface(), self.scoreboard.position))
+        segments = []
+        if self.debris is not None:
+            segments.extend(self.debris.get_segments())
+        if self.particles is not None:
+            segments.extend(self.particles.get_segments())
+        return FrameSnapshot(self.num_ticks, self.game_state, tuple(blits), tuple(segments))
+
+    def draw_captured_frame(self, frame):
+        if self.use_dirty_rects:
+            for rect in self.drawn_rects:
+                self.renderer.fill(DISPLAY_PARAMS.bg_color, rect)
+        else:
+            self.renderer.fill(DISPLAY_PARAMS.bg_color)
+        self.previous_drawn_rects = self.drawn_rects
+        self.drawn_rects = self.renderer.blits(frame.blits)
+        for color, start, end in frame.segments:
+            self.drawn_rects.append(self.renderer.draw_line(color, start, end))
 
     def check_player_bullet_collisions(self) -> tuple[int, bool]:
         is_saucer_collided = False
@@ -396,38 +1924,75 @@ class Game:
         collided_asteroids = set()
         collided_bullets = set()
         new_asteroids = []
+        self.rebuild_asteroid_grid()
         for i, bullet in enumerate(self.player_bullets):
-            if self.saucer is not None and self.saucer.rect.colliderect(bullet.rect):
+            if self.saucer is not None and self.collides(self.saucer, bullet):
                 collided_bullets.add(i)
+                if not is_saucer_collided:
+                    self.score_hit(bullet, 10)
                 is_saucer_collided = True
                 continue
-            for j, asteroid in enumerate(self.asteroids):
-                if asteroid.rect.colliderect(bullet.rect):
+            for j in self.asteroid_grid.query(bullet.rect):
+                asteroid = self.asteroids[j]
+                if self.collides(asteroid, bullet):
                     destroyed_asteroid_sizes.append(asteroid.size)
+                    self.score_hit(bullet, 1)
+                    if self.particles is not None:
+                        self.particles.emit_asteroid_explosion(asteroid.position, asteroid.size)
                     collided_asteroids.add(j)
                     collided_bullets.add(i)
                     if asteroid.size > 40:
                         new_asteroids.extend(
                             [
-                                Asteroid(position=asteroid.position, size=asteroid.size * 0.65)
+                                self.new_asteroid(position=asteroid.position, size=asteroid.size * 0.65)
                                 for _ in range(2)
                             ]
                         )
-        self.asteroids = [
-            asteroid
-            for i, asteroid in enumerate(self.asteroids) if i not in collided_asteroids
-        ]
-        self.player_bullets = [
-            bullet
-            for j, bullet in enumerate(self.player_bullets) if j not in collided_bullets
-        ]
+        if collided_asteroids:
+            if self.asteroid_store is not None:
+                for i in collided_asteroids:
+                    self.asteroids[i].release()
+            self.asteroids = [
+                asteroid
+                for i, asteroid in enumerate(self.asteroids) if i not in collided_asteroids
+            ]
+        if collided_bullets:
+            self._recycle_collided_bullets(self.player_bullets, collided_bullets)
         self.asteroids.extend(new_asteroids)
+        if collided_asteroids:
+            self.rebuild_asteroid_grid()
         return destroyed_asteroid_sizes, is_saucer_collided
 
-    def check_player_collision(self):
-        smaller_rect = self.player.rect.copy().scale_by(0.5)
-        for asteroid in self.asteroids:
-            if asteroid.rect.colliderect(smaller_rect):
+    def rebuild_asteroid_grid(self):
+        if self.asteroid_store is not None:
+            _, topleft, sizes = self.asteroid_store.get_rects(self.asteroids)
+            self.asteroid_grid.rebuild_from_arrays(topleft, sizes)
+        else:
+            self.asteroid_grid.rebuild(asteroid.rect for asteroid in self.asteroids)
+
+    def score_hit(self, bullet, points):
+        self.scoreboard.increment_score(points)
+
+    def collides(self, first, second):
+        # rect broadphase first; the cached masks only decide when the rects overlap
+        if not first.rect.colliderect(second.rect):
+            return False
+        return not self.precise_collisions or masks_overlap(first.mask, first.rect, second.mask, second.rect)
+
+    def check_player_collision(self, player=None):
+        if player is None:
+            player = self.player
+        if self.precise_collisions:
+            for i in self.asteroid_grid.query(player.rect):
+                if self.collides(player, self.asteroids[i]):
+                    return True
+            for bullet in self.saucer_bullets:
+                if self.collides(player, bullet):
+                    return True
+            return self.saucer is not None and self.collides(player, self.saucer)
+        smaller_rect = player.rect.copy().scale_by(0.5)
+        for i in self.asteroid_grid.query(smaller_rect):
+            if self.asteroids[i].rect.colliderect(smaller_rect):
                 return True
         for bullet in self.saucer_bullets:
             if bullet.rect.colliderect(smaller_rect):
@@ -438,110 +2003,366 @@ class Game:
 
     def show_game_over(self):
         font_size = 32
-        font = pygame.font.Font(pygame.font.get_default_font(), font_size)
         lines = [
             'GAME OVER...',
             '(press R to restart)'
         ]
+        rects = []
         for i, line in enumerate(lines):
-            text_surface = font.render(
-                line,
-                True,
-                (255, 0, 0),
-            )
+            text_surface = self.resources.get_text(line, font_size, (255, 0, 0))
             text_rect = text_surface.get_rect(
                 center=(
                     DISPLAY_PARAMS.width // 2,
                     DISPLAY_PARAMS.height // 2 + font_size * (i - 1)
                 )
             )
-            self.screen.blit(text_surface, text_rect)
+            rects.append(self.renderer.blit(text_surface, text_rect))
+        return rects
 
     def _generate_bullets(self, is_shooting):
         if is_shooting:
-            self.player_bullets.append(Bullet(*self.player.get_new_bullet_params()))
+            self.player_bullets.append(self.new_bullet(*self.player.get_new_bullet_params()))
             self.sound_mixer.play_shooting()
-        self.player_bullets = [bullet for bullet in self.player_bullets if not bullet.is_exhausted()]
-
         if self.saucer is not None:
             bullet_params = self.saucer.maybe_shoot(self.player.get_position())
             if bullet_params is not None:
-                self.saucer_bullets.append(Bullet(*bullet_params, color=(192, 0, 0), speed=6))
-        self.saucer_bullets = [bullet for bullet in self.saucer_bullets if not bullet.is_exhausted()]
+                self.saucer_bullets.append(self.new_bullet(*bullet_params, color=(192, 0, 0), speed=6))
+        self._age_bullets()
+
+    def _age_bullets(self):
+        if self.bullet_store is not None:
+            self.bullet_store.update_life_counters()
+        self._recycle_exhausted_bullets(self.player_bullets)
+        self._recycle_exhausted_bullets(self.saucer_bullets)
+
+    def _recycle_exhausted_bullets(self, bullets):
+        # compacts the list in place, keeping the order of the remaining bullets
+        num_remaining = 0
+        for bullet in bullets:
+            if bullet.is_exhausted():
+                self.bullet_pool.release(bullet)
+            else:
+                bullets[num_remaining] = bullet
+                num_remaining += 1
+        del bullets[num_remaining:]
+
+    def _recycle_collided_bullets(self, bullets, collided_bullets):
+        num_remaining = 0
+        for j, bullet in enumerate(bullets):
+            if j in collided_bullets:
+                self.bullet_pool.release(bullet)
+            else:
+                bullets[num_remaining] = bullet
+                num_remaining += 1
+        del bullets[num_remaining:]
 
     def _update_positions(self, is_accelerating, rotation_direction):
         self.player.update_orientation(rotation_direction)
         self.player.update_position(is_accelerating)
+        self._move_entities()
+
+    def _move_entities(self):
         if self.saucer is not None:
             self.saucer.update_position()
-        for bullet in self.player_bullets + self.saucer_bullets:
-            bullet.update_position()
-        for asteroid in self.asteroids:
-            asteroid.update_position()
+        if self.bullet_store is not None:
+            self.bullet_store.update_positions()
+        else:
+            for bullet in self.player_bullets:
+                bullet.update_position()
+            for bullet in self.saucer_bullets:
+                bullet.update_position()
+        if self.asteroid_store is not None:
+            self.asteroid_store.update_positions()
+        else:
+            for asteroid in self.asteroids:
+                asteroid.update_position()
 
     def _process_collisions(self, ticks):
+        self._process_bullet_collisions(ticks)
+        is_player_collided = self.check_player_collision()
+        if is_player_collided:
+            self.sound_mixer.play_explosion()
+            self.player.is_dead = True
+            if self.particles is not None:
+                self.particles.emit_ship_explosion(self.player.get_position())
+            else:
+                self.debris = Debris(self.player.get_position(), rng=self.rng)
+
+    def _process_bullet_collisions(self, ticks):
         destroyed_asteroid_sizes, is_saucer_collided = self.check_player_bullet_collisions()
-        self.scoreboard.increment_score(len(destroyed_asteroid_sizes) + 10 * is_saucer_collided)
         if destroyed_asteroid_sizes:
             self.sound_mixer.play_explosion(max(size for size in destroyed_asteroid_sizes))
         if is_saucer_collided:
+            if self.particles is not None:
+                self.particles.emit_saucer_explosion(self.saucer.position)
             self.saucer = None
             self.sound_mixer.play_explosion()
             self.last_saucer_death_time = ticks
-        is_player_collided = self.check_player_collision()
-        if is_player_collided:
-            self.sound_mixer.play_explosion()
-            self.player.is_dead = True
-            self.debris = Debris(self.player.get_position())
 
     def _spawn(self, ticks):
         if not self.asteroids:
+            self.collector.collect()
             self.asteroids = self.spawn_asteroids(self.NUM_SPAWNED_ASTEROIDS)
         if self.saucer is None and ticks - self.last_saucer_death_time > self.SAUCER_RESPAWN_COOLDOWN_MS:
-            self.saucer = EnemySaucer(self.get_valid_spawn_positions(1)[0])
+            self.saucer = self.new_saucer(self.get_valid_spawn_positions(1)[0])
 
-    def game_loop(self):
-        rotation_direction = 0
-        is_accelerating = False
+    def step(self, player_input, ticks):
+        if player_input.is_exiting:
+            self.game_state = GameState.EXITED
+            return
         is_shooting = False
-        ticks = pygame.time.get_ticks()
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (
-                    event.type == pygame.KEYDOWN and pygame.key.get_pressed()[pygame.K_ESCAPE]):
-                self.game_state = GameState.EXITED
-                return
-
-        rotation_direction = self.get_rotation_direction(pygame.key.get_pressed())
-        is_accelerating = pygame.key.get_pressed()[pygame.K_w]
         if ticks - self.last_bullet_time > self.BULLET_COOLDOWN_MS:
-            is_shooting = pygame.key.get_pressed()[pygame.K_SPACE]
+            is_shooting = player_input.is_shooting
             if is_shooting:
                 self.last_bullet_time = ticks
         if self.game_state == GameState.STARTING:
-            self.draw_frame()
+            self.player.update_sprite()
             self.game_state = GameState.RUNNING
         elif self.game_state == GameState.RUNNING:
             self._generate_bullets(is_shooting)
-            self._update_positions(is_accelerating, rotation_direction)
+            self.profiler.mark('_generate_bullets')
+            self._update_positions(player_input.is_accelerating, player_input.rotation_direction)
+            self.profiler.mark('_update_positions')
             self._process_collisions(ticks)
-            self.draw_frame()
+            self.profiler.mark('_process_collisions')
             if self.player.is_dead:
                 self.game_state = GameState.GAME_OVER
+                self.collector.collect()
             else:
+                self.player.update_sprite()
                 self._spawn(ticks)
+                self.profiler.mark('_spawn')
         if self.game_state == GameState.GAME_OVER:
-            self.debris.update()
-            self.draw_frame()
-            self.show_game_over()
-            if pygame.key.get_pressed()[pygame.K_r]:
+            if self.debris is not None:
+                self.debris.update()
+            if player_input.is_restarting:
                 self.game_state = GameState.RESTARTING
-        pygame.display.set_caption(f'jetblack (FPS: {self.clock.get_fps():.2f})')
-        pygame.display.update()
-        self.clock.tick(DISPLAY_PARAMS.max_fps)
+        self._update_particles()
+
+    def _update_particles(self):
+        if self.particles is not None:
+            self.particles.update()
+            self.profiler.mark('_update_particles')
+
+    def render(self, frame=None):
+        self.compose_frame(frame)
+        # talking to the window manager is costly, so refresh the FPS caption only now and then
+        now = pygame.time.get_ticks()
+        if self.last_caption_time is None or now - self.last_caption_time >= self.CAPTION_UPDATE_INTERVAL_MS:
+            self.renderer.set_caption(f'jetblack (FPS: {self.clock.get_fps():.2f})')
+            self.last_caption_time = now
+        if self.use_dirty_rects and not self.needs_full_update:
+            self.renderer.present(self.previous_drawn_rects + self.drawn_rects)
+        else:
+            self.renderer.present()
+            self.needs_full_update = False
+        self.profiler.mark('display_flush')
+
+    def compose_frame(self, frame=None):
+        # draws everything that ends up on screen, overlays included, and captures the result
+        if frame is None:
+            self.draw_frame(self.alpha)
+            game_state = self.game_state
+        else:
+            self.draw_captured_frame(frame)
+            game_state = frame.game_state
+        if game_state in [GameState.GAME_OVER, GameState.RESTARTING]:
+            self.drawn_rects.extend(self.show_game_over())
+        if self.profiler.is_overlay_visible:
+            self.drawn_rects.extend(self.profiler.draw_overlay(self.renderer, self.resources.get_font(14)))
+        self.profiler.mark('draw_frame')
+        self._record_frame(self.num_ticks if frame is None else frame.num_ticks)
+
+    def _record_frame(self, num_ticks):
+        if self.frame_recorder is not None:
+            self.frame_recorder.capture(self.renderer.get_frame_surface(), num_ticks)
+            self.profiler.mark('capture')
+
+    def close(self):
+        try:
+            if self.frame_recorder is not None:
+                self.frame_recorder.close()
+        finally:
+            self.profiler.stop()
+
+    def get_entity_counts(self):
+        return dict(
+            asteroids=len(self.asteroids),
+            player_bullets=len(self.player_bullets),
+            saucer_bullets=len(self.saucer_bullets),
+            saucers=int(self.saucer is not None),
+            particles=self.particles.get_num_alive() if self.particles is not None else 0,
+        )
+
+    def save_state(self, include_rng=True):
+        player = self.player
+        saucer = self.saucer
+        # timers are stored as ages at the time of the next tick, so they can be rebased onto any game's clock
+        now = self.get_tick_time()
+        chunks = [Snapshot.HEADER.pack(
+            Snapshot.MAGIC, Snapshot.VERSION, self.game_state.value, include_rng, self.seed,
+            self.scoreboard.get_score(), now - self.last_bullet_time, now - self.last_saucer_death_time, self.num_ticks,
+            len(self.asteroids), len(self.player_bullets), len(self.saucer_bullets), saucer is not None,
+        )]
+        chunks.append(Snapshot.PLAYER.pack(
+            *player.rect, player.orientation, *player.normalized_velocity, player.speed, player.is_dead))
+        for asteroid in self.asteroids:
+            if asteroid.shape_key is None:
+                raise ValueError('Snapshots need asteroids drawn from an AsteroidShapeCache')
+            chunks.append(Snapshot.ASTEROID.pack(
+                *asteroid.position, *asteroid.normalized_velocity, asteroid.speed, *asteroid.shape_key))
+        for bullet in self.player_bullets + self.saucer_bullets:
+            chunks.append(Snapshot.BULLET.pack(*bullet.position, *bullet.normalized_velocity, bullet.life_counter))
+        if saucer is not None:
+            chunks.append(Snapshot.SAUCER.pack(*saucer.position, *saucer.normalized_velocity))
+        if include_rng:
+            _, mt_state, gauss_next = self.rng.getstate()
+            chunks.append(Snapshot.RNG.pack(*mt_state, math.nan if gauss_next is None else gauss_next))
+        return b''.join(chunks)
+
+    def load_state(self, snapshot):
+        (magic, version, game_state, has_rng, seed, score, bullet_age, saucer_death_age,
+         self.num_ticks, num_asteroids, num_player_bullets, num_saucer_bullets,
+         has_saucer) = Snapshot.HEADER.unpack_from(snapshot)
+        if magic != Snapshot.MAGIC or version != Snapshot.VERSION:
+            raise ValueError(f'Not a jetblack snapshot (version {Snapshot.VERSION})')
+        now = self.get_tick_time()
+        self.last_bullet_time = now - bullet_age
+        self.last_saucer_death_time = now - saucer_death_age
+        offset = Snapshot.HEADER.size
+        self.seed = seed
+        self.game_state = GameState(game_state)
+        self.scoreboard.reset()
+        self.scoreboard.increment_score(score)
+        *player_rect, orientation, velocity_x, velocity_y, speed, is_dead = Snapshot.PLAYER.unpack_from(
+            snapshot, offset)
+        offset += Snapshot.PLAYER.size
+        self.player = PlayerSpaceship(pygame.Rect(player_rect).center)
+        self.player.orientation = self.player.previous_orientation = orientation
+        self.player.normalized_velocity = pygame.Vector2(velocity_x, velocity_y)
+        self.player.speed = speed
+        self.player.is_dead = is_dead
+        self.player.update_sprite()
+        self.player.rect = pygame.Rect(player_rect)  # a dead ship keeps the size it had when it was hit
+        # restored entities get their kinematics from the snapshot, so their constructors must not touch self.rng
+        scratch_rng = random.Random(0)
+        if self.asteroid_store is not None:
+            for asteroid in self.asteroids:
+                asteroid.release()
+        self.asteroids = []
+        for x, y, velocity_x, velocity_y, speed, bucket, variant in Snapshot.ASTEROID.iter_unpack(
+                snapshot[offset:offset + num_asteroids * Snapshot.ASTEROID.size]):
+            asteroid = self.new_asteroid(pygame.Vector2(x, y), shape_key=(bucket, variant), rng=scratch_rng)
+            asteroid.normalized_velocity = pygame.Vector2(velocity_x, velocity_y)
+            asteroid.speed = speed
+            self.asteroids.append(asteroid)
+        offset += num_asteroids * Snapshot.ASTEROID.size
+        for bullets, num_bullets, bullet_kwargs in [
+            (self.player_bullets, num_player_bullets, dict()),
+            (self.saucer_bullets, num_saucer_bullets, dict(color=(192, 0, 0), speed=6)),
+        ]:
+            for bullet in bullets:
+                self.bullet_pool.release(bullet)
+            bullets.clear()
+            for x, y, velocity_x, velocity_y, life_counter in Snapshot.BULLET.iter_unpack(
+                    snapshot[offset:offset + num_bullets * Snapshot.BULLET.size]):
+                bullet = self.new_bullet(pygame.Vector2(x, y), pygame.Vector2(velocity_x, velocity_y), **bullet_kwargs)
+                bullet.life_counter = life_counter
+                bullets.append(bullet)
+            offset += num_bullets * Snapshot.BULLET.size
+        self.saucer = None
+        if has_saucer:
+            x, y, velocity_x, velocity_y = Snapshot.SAUCER.unpack_from(snapshot, offset)
+            offset += Snapshot.SAUCER.size
+            self.saucer = self.new_saucer(pygame.Vector2(x, y))
+            self.saucer.normalized_velocity = pygame.Vector2(velocity_x, velocity_y)
+        if has_rng:
+            *mt_state, gauss_next = Snapshot.RNG.unpack_from(snapshot, offset)
+            self.rng.setstate((3, tuple(mt_state), None if math.isnan(gauss_next) else gauss_next))
+        # explosions are not part of the snapshot
+        self.debris = None
+        if is_dead and self.particles is None:
+            self.debris = Debris(self.player.get_position(), rng=scratch_rng)
+        if self.particles is not None:
+            self.particles.reset(seed)
+        self.needs_full_update = True
+
+    def rewind(self, num_ticks=1):
+        # restores the newest snapshot at least num_ticks old, or the oldest one kept; returns whether any was
+        target_ticks = self.num_ticks - num_ticks
+        snapshot = None
+        while len(self.rewind_buffer) > 0:
+            snapshot = self.rewind_buffer.pop()
+            if Snapshot.get_num_ticks(snapshot) <= target_ticks:
+                break
+        if snapshot is None:
+            return False
+        self.load_state(snapshot)
+        return True
+
+    def get_simulation_ticks(self):
+        return self.start_ticks + self.num_ticks * 1000 // DISPLAY_PARAMS.tick_rate
+
+    def get_tick_time(self):
+        # the ticks the next step() will be given by game_loop()
+        return self.get_simulation_ticks() if self.fixed_timestep else self.clock.get_ticks()
+
+    def tick(self, player_input, ticks):
+        if self.replay is not None:
+            self.replay.append(player_input, ticks)
+        if self.rewind_buffer is not None and self.num_ticks % self.REWIND_INTERVAL_TICKS == 0:
+            self.rewind_buffer.push(self.save_state())
+        self.step(player_input, ticks)
+        self.num_ticks += 1
+
+    def catch_up(self, player_input):
+        now = self.clock.get_ticks()
+        self.accumulated_ms += now - self.last_frame_ticks
+        self.last_frame_ticks = now
+        if player_input.is_exiting:
+            self.tick(player_input, self.get_simulation_ticks())
+            return
+        num_steps = 0
+        while self.accumulated_ms >= self.tick_ms and self.game_state != GameState.RESTARTING:
+            if num_steps == self.MAX_CATCH_UP_STEPS:
+                # too far behind: drop the backlog and let the game slow down rather than spiral
+                self.accumulated_ms %= self.tick_ms
+                break
+            self.tick(player_input, self.get_simulation_ticks())
+            self.accumulated_ms -= self.tick_ms
+            num_steps += 1
+        self.alpha = self.accumulated_ms / self.tick_ms
+
+    def game_loop(self):
+        self.profiler.begin_frame()
+        player_input = self.input_source.read()
+        if player_input.is_toggling_profiler:
+            self.profiler.is_overlay_visible = not self.profiler.is_overlay_visible
+            self.needs_full_update = True
+        self.profiler.mark('input')
+        if self.fixed_timestep:
+            self.catch_up(player_input)
+        else:
+            self.tick(player_input, self.clock.get_ticks())
+        if self.game_state == GameState.EXITED:
+            return
+        if not self.headless:
+            self.render()
+        elif self.frame_recorder is not None:
+            # headless games only draw what is being captured
+            self.compose_frame()
+        self.profiler.end_frame(self.get_entity_counts)
+        self.collector.maybe_collect()
+        self.clock.tick()
 
     def run(self):
-        while self.game_state not in [GameState.EXITED, GameState.RESTARTING]:
-            self.game_loop()
+        # the garbage collection policy only applies while playing; restarts collect in between
+        self.collector.start()
+        try:
+            while self.game_state not in [GameState.EXITED, GameState.RESTARTING]:
+                self.game_loop()
+        finally:
+            self.collector.stop()
         if self.game_state == GameState.RESTARTING:
             return True
         else:
@@ -549,8 +2370,61 @@ class Game:
 
 
 if __name__ == '__main__':
-    while True:
-        game = Game()
-        restart = game.run()
-        if not restart:
-            break
+    parser = argparse.ArgumentParser(description='A minimalistic game inspired by the classic "Asteroids".')
+    parser.add_argument('--seed', type=int, help='seed for the game RNG')
+    parser.add_argument('--record', metavar='PATH', help='save a replay of the last played game to PATH')
+    parser.add_argument('--replay', metavar='PATH', help='play back a replay recorded with --record')
+    parser.add_argument('--headless', action='store_true', help='play back without window, audio or frame cap')
+    parser.add_argument('--max-fps', type=int, default=DISPLAY_PARAMS.max_fps,
+                        help=f'frame rate cap; the simulation always runs at {DISPLAY_PARAMS.tick_rate} ticks per '
+                             'second')
+    parser.add_argument('--renderer', choices=['surface', 'texture'], default='surface',
+                        help='draw with software blits or with SDL textures (GPU if available)')
+    parser.add_argument('--pipelined', action='store_true', help='simulate on a worker thread while rendering')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='profile every frame (F3 shows the overlay) and export to a .json or .csv file on exit')
+    parser.add_argument('--track-allocations', action='store_true',
+                        help='with --profile, also record allocated bytes, memory blocks and GC pauses per phase')
+    parser.add_argument('--gc', choices=['automatic', 'manual'], default='automatic',
+                        help='manual: freeze startup objects and only collect garbage between waves and on game over')
+    parser.add_argument('--capture', metavar='PATH', help='write every rendered frame to PATH in the background')
+    parser.add_argument('--capture-format', choices=['raw', 'zlib'], default='zlib',
+                        help='store captured frames as raw pixels or zlib-compressed')
+    args = parser.parse_args()
+    if args.track_allocations and args.profile is None:
+        parser.error('--track-allocations requires --profile')
+    if args.pipelined and (args.profile is not None or args.replay is not None):
+        parser.error('--pipelined cannot be combined with --profile or --replay')
+    if args.replay is not None:
+        replay = Replay.load(args.replay)
+        playback = ReplayPlayback(replay)
+        game = Game(headless=args.headless, input_source=playback, clock=playback, seed=replay.seed,
+                    profile=args.profile is not None, renderer=args.renderer,
+                    track_allocations=args.track_allocations, gc_policy=args.gc, capture=args.capture,
+                    capture_format=args.capture_format)
+        game.run()
+        print(f'Score: {game.scoreboard.get_score()}')
+        if args.profile is not None:
+            game.profiler.export(args.profile)
+    else:
+        game = Game(clock=RealtimeClock(args.max_fps), seed=args.seed, record=args.record is not None,
+                    profile=args.profile is not None, renderer=args.renderer,
+                    track_allocations=args.track_allocations, gc_policy=args.gc, capture=args.capture,
+                    capture_format=args.capture_format)
+        while True:
+            if args.pipelined:
+                runner = PipelinedRunner(game)
+                restart = runner.run()
+                print('Simulation/render overlap: {overlap_ratio:.0%}'.format(**runner.get_overlap()))
+            else:
+                restart = game.run()
+            if args.record is not None:
+                game.replay.save(args.record)
+            if args.profile is not None:
+                game.profiler.export(args.profile)
+            if not restart:
+                break
+            game.reset(args.seed)
+    game.close()
+    if game.frame_recorder is not None:
+        print(f'Captured {game.frame_recorder.num_captured} frames, dropped {game.frame_recorder.num_dropped}')
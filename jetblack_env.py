@@ -0,0 +1,229 @@
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+
+import numpy as np
+import pygame
+
+from jetblack import (
+    DISPLAY_PARAMS,
+    AsteroidShapeCache,
+    EntityKind,
+    Game,
+    GameState,
+    PlayerInput,
+    SimulatedClock,
+    SurfaceRenderer,
+)
+
+# every combination of (rotation, accelerate, shoot) is one discrete action
+ACTIONS = [
+    PlayerInput(rotation_direction=rotation_direction, is_accelerating=is_accelerating, is_shooting=is_shooting)
+    for rotation_direction in [0, 1, -1]
+    for is_accelerating in [False, True]
+    for is_shooting in [False, True]
+]
+
+ENTITY_FEATURES = ['kind', 'x', 'y', 'velocity_x', 'velocity_y', 'size']
+
+
+class JetblackEnv:
+    def __init__(self, observation='entities', max_entities=128, seed=None, frame_skip=1, frame_buffer=None):
+        if observation not in ['entities', 'pixels']:
+            raise ValueError(f'Unknown observation type: {observation}')
+        self.observation = observation
+        self.max_entities = max_entities
+        self.frame_skip = frame_skip
+        self.seed = seed
+        self.game = None
+        self.clock = None
+        # pixel observations: the game draws straight into this (height, width, RGBX) array, so the
+        # observation is a view of the frame rather than a copy
+        self.frame_buffer = None
+        if observation == 'pixels':
+            if frame_buffer is None:
+                frame_buffer = np.zeros(self.get_buffer_shape(), dtype=np.uint8)
+            self.frame_buffer = frame_buffer
+        self.asteroid_shape_cache = AsteroidShapeCache()  # shared by every episode
+        self.asteroid_shape_cache.preload()
+
+    def get_observation_shape(self):
+        if self.observation == 'pixels':
+            return DISPLAY_PARAMS.height, DISPLAY_PARAMS.width, 3
+        return self.max_entities, len(ENTITY_FEATURES)
+
+    def get_buffer_shape(self):
+        if self.observation == 'pixels':
+            return DISPLAY_PARAMS.height, DISPLAY_PARAMS.width, 4
+        return self.get_observation_shape()
+
+    def get_observation_dtype(self):
+        return np.uint8 if self.observation == 'pixels' else np.float32
+
+    def reset(self, seed=None, out=None):
+        if seed is None:
+            seed = self.seed
+            if self.seed is not None:
+                self.seed += 1  # consecutive episodes should not be identical
+        if self.game is None:
+            self.clock = SimulatedClock()
+            self.game = Game(headless=True, clock=self.clock, seed=seed, asteroid_shape_cache=self.asteroid_shape_cache)
+            if self.frame_buffer is not None:
+                self.game.renderer = SurfaceRenderer(pygame.image.frombuffer(
+                    self.frame_buffer, (DISPLAY_PARAMS.width, DISPLAY_PARAMS.height), 'RGBX'))
+        else:
+            # later episodes restart the same game in place
+            self.clock.num_ticks = 0
+            self.game.reset(seed)
+        self.advance(PlayerInput())  # leaves the STARTING state
+        return self.get_observation(out)
+
+    def advance(self, player_input):
+        self.game.step(player_input, self.clock.get_ticks())
+        self.clock.tick()
+
+    def step(self, action, out=None):
+        player_input = ACTIONS[action]
+        score = self.game.scoreboard.get_score()
+        for _ in range(self.frame_skip):
+            self.advance(player_input)
+            if self.game.game_state != GameState.RUNNING:
+                break
+        reward = self.game.scoreboard.get_score() - score
+        is_done = self.game.game_state != GameState.RUNNING
+        return self.get_observation(out), reward, is_done
+
+    def get_observation(self, out=None):
+        if self.observation == 'pixels':
+            self.game.draw_frame()
+            return self.frame_buffer[..., :3]  # overwritten in place by the next step
+        return self.get_entities(out)
+
+    def get_entities(self, out=None):
+        if out is None:
+            out = np.zeros(self.get_observation_shape(), dtype=np.float32)
+        else:
+            out[...] = 0
+        game = self.game
+        entities = []
+        if not game.player.is_dead:
+            entities.append((EntityKind.PLAYER, game.player.get_position(),
+                             game.player.normalized_velocity * game.player.speed, max(game.player.rect.size)))
+        if game.saucer is not None:
+            entities.append((EntityKind.SAUCER, game.saucer.position,
+                             game.saucer.normalized_velocity * game.saucer.speed, max(game.saucer.rect.size)))
+        for kind, group in [
+            (EntityKind.ASTEROID, game.asteroids),
+            (EntityKind.PLAYER_BULLET, game.player_bullets),
+            (EntityKind.SAUCER_BULLET, game.saucer_bullets),
+        ]:
+            for entity in group:
+                entities.append((kind, entity.position, entity.normalized_velocity * entity.speed, entity.size))
+        for row, (kind, position, velocity, size) in zip(out, entities[:self.max_entities]):
+            row[:] = kind, position[0], position[1], velocity[0], velocity[1], size
+        return out
+
+
+def run_worker(connection, env_kwargs, env_indices, buffer_names, buffer_shape, buffer_dtype, num_envs):
+    observation_memory = shared_memory.SharedMemory(name=buffer_names['observations'])
+    reward_memory = shared_memory.SharedMemory(name=buffer_names['rewards'])
+    done_memory = shared_memory.SharedMemory(name=buffer_names['dones'])
+    observations = np.ndarray((num_envs, *buffer_shape), dtype=buffer_dtype, buffer=observation_memory.buf)
+    rewards = np.ndarray(num_envs, dtype=np.float32, buffer=reward_memory.buf)
+    dones = np.ndarray(num_envs, dtype=bool, buffer=done_memory.buf)
+    if env_kwargs.get('observation') == 'pixels':
+        envs = {i: JetblackEnv(frame_buffer=observations[i], **env_kwargs) for i in env_indices}
+    else:
+        envs = {i: JetblackEnv(**env_kwargs) for i in env_indices}
+    try:
+        while True:
+            command, payload = connection.recv()
+            if command == 'reset':
+                for i, env in envs.items():
+                    env.reset(seed=None if payload is None else payload[i], out=observations[i])
+            elif command == 'step':
+                for i, env in envs.items():
+                    _, rewards[i], dones[i] = env.step(payload[i], out=observations[i])
+                    if dones[i]:
+                        env.reset(out=observations[i])
+            elif command == 'close':
+                break
+            connection.send(None)
+    finally:
+        del envs, observations, rewards, dones
+        observation_memory.close()
+        reward_memory.close()
+        done_memory.close()
+
+
+class VectorEnv:
+    # steps num_envs games split across worker processes; observations, rewards and done flags are written by
+    # the workers straight into shared memory, and finished games are reset automatically
+    def __init__(self, num_envs, num_workers=None, seed=None, **env_kwargs):
+        self.num_envs = num_envs
+        num_workers = min(num_envs, num_workers or os.cpu_count() or 1)
+        probe_env = JetblackEnv(**env_kwargs)
+        buffer_shape = probe_env.get_buffer_shape()
+        buffer_dtype = probe_env.get_observation_dtype()
+        self.observation_shape = probe_env.get_observation_shape()
+        self.seed = seed
+        observation_size = num_envs * int(np.prod(buffer_shape)) * np.dtype(buffer_dtype).itemsize
+        self.memories = dict(
+            observations=shared_memory.SharedMemory(create=True, size=observation_size),
+            rewards=shared_memory.SharedMemory(create=True, size=num_envs * 4),
+            dones=shared_memory.SharedMemory(create=True, size=num_envs),
+        )
+        self.buffers = np.ndarray((num_envs, *buffer_shape), dtype=buffer_dtype,
+                                  buffer=self.memories['observations'].buf)
+        # pixel buffers carry an unused padding channel; hide it behind a view
+        self.observations = self.buffers[..., :3] if buffer_shape != self.observation_shape else self.buffers
+        self.rewards = np.ndarray(num_envs, dtype=np.float32, buffer=self.memories['rewards'].buf)
+        self.dones = np.ndarray(num_envs, dtype=bool, buffer=self.memories['dones'].buf)
+        buffer_names = {key: memory.name for key, memory in self.memories.items()}
+        self.connections = []
+        self.workers = []
+        for env_indices in np.array_split(np.arange(num_envs), num_workers):
+            parent_connection, child_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=run_worker,
+                args=(child_connection, env_kwargs, env_indices.tolist(), buffer_names, buffer_shape, buffer_dtype,
+                      num_envs),
+                daemon=True,
+            )
+            worker.start()
+            self.connections.append(parent_connection)
+            self.workers.append(worker)
+
+    def send(self, command, payload=None):
+        for connection in self.connections:
+            connection.send((command, payload))
+        for connection in self.connections:
+            connection.recv()
+
+    def reset(self):
+        seeds = None if self.seed is None else [self.seed + i for i in range(self.num_envs)]
+        self.send('reset', seeds)
+        return self.observations
+
+    def step(self, actions):
+        self.send('step', [int(action) for action in actions])
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        if not self.workers:
+            return
+        for connection in self.connections:
+            connection.send(('close', None))
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        del self.buffers, self.observations, self.rewards, self.dones
+        for memory in self.memories.values():
+            memory.close()
+            memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,559 @@
+import argparse
+from collections import deque
+import math
+import selectors
+import socket
+import struct
+import time
+
+import pygame
+
+from jetblack import (
+    DISPLAY_PARAMS,
+    AsteroidShapeCache,
+    Bullet,
+    EnemySaucer,
+    EntityKind,
+    Game,
+    GameState,
+    KeyboardInput,
+    PlayerInput,
+    PlayerSpaceship,
+    PoissonDiskSampler,
+    SimulatedClock,
+    decode_input_flags,
+    encode_input_flags,
+    get_random_position,
+)
+
+# every message is a (type, payload length) header followed by the payload
+MESSAGE_HEADER = struct.Struct('<BI')
+WELCOME = 1  # server -> client, once: the client's player id
+INPUT = 2  # client -> server, once per client tick
+SNAPSHOT = 3  # server -> client, once per server tick
+
+WELCOME_PAYLOAD = struct.Struct('<IHQ')  # player id, tick rate, seed
+INPUT_PAYLOAD = struct.Struct('<IB')  # input sequence number, input flags
+# tick, sequence number of the last input applied to the client's ship, then the counts of each record type
+SNAPSHOT_HEADER = struct.Struct('<IIHHH')
+# kind, id, quantized position and velocity, and a kind-specific field: the orientation of ships and the
+# shape key of asteroids
+ENTITY_RECORD = struct.Struct('<BIHHhhH')
+REMOVAL_RECORD = struct.Struct('<I')
+SCORE_RECORD = struct.Struct('<II')
+
+POSITION_SCALE = 16  # 1/16 pixel
+VELOCITY_SCALE = 256  # 1/256 pixel per tick
+ORIENTATION_SCALE = 100  # 1/100 degree
+# clients dead-reckon entities from their last record; one is only resent once it drifts further than this
+MAX_EXTRAPOLATION_ERROR = 1.0
+
+
+def quantize_position(value, extent):
+    return round(value % extent * POSITION_SCALE) % (extent * POSITION_SCALE)
+
+
+def quantize_velocity(value):
+    return max(-32768, min(32767, round(value * VELOCITY_SCALE)))
+
+
+def set_ship_velocity(ship, velocity_x, velocity_y):
+    # ships move with their quantized velocity on the server as well as in client predictions, so replaying
+    # inputs from a ship record reproduces the server's ship exactly
+    velocity = pygame.Vector2(velocity_x, velocity_y) / VELOCITY_SCALE
+    ship.speed = velocity.magnitude()
+    if ship.speed > 0:
+        ship.normalized_velocity = velocity.normalize()
+
+
+def extrapolate(record, num_ticks):
+    # position of an entity num_ticks after its record was taken; server and client must agree on this exactly
+    _, x, y, velocity_x, velocity_y, _ = record
+    return (
+        (x / POSITION_SCALE + velocity_x / VELOCITY_SCALE * num_ticks) % DISPLAY_PARAMS.width,
+        (y / POSITION_SCALE + velocity_y / VELOCITY_SCALE * num_ticks) % DISPLAY_PARAMS.height,
+    )
+
+
+def get_wrapped_distance(first, second):
+    dx = abs(first[0] - second[0]) % DISPLAY_PARAMS.width
+    dy = abs(first[1] - second[1]) % DISPLAY_PARAMS.height
+    return math.hypot(min(dx, DISPLAY_PARAMS.width - dx), min(dy, DISPLAY_PARAMS.height - dy))
+
+
+def pack_message(message_type, payload):
+    return MESSAGE_HEADER.pack(message_type, len(payload)) + payload
+
+
+def unpack_messages(buffer):
+    # yields complete messages and removes them from the buffer, leaving any partial one behind
+    while len(buffer) >= MESSAGE_HEADER.size:
+        message_type, length = MESSAGE_HEADER.unpack_from(buffer)
+        if len(buffer) < MESSAGE_HEADER.size + length:
+            break
+        payload = bytes(buffer[MESSAGE_HEADER.size:MESSAGE_HEADER.size + length])
+        del buffer[:MESSAGE_HEADER.size + length]
+        yield message_type, payload
+
+
+class ArenaGame(Game):
+    # the Game simulation with any number of ships, each with its own bullets, score and respawn timer
+    RESPAWN_COOLDOWN_MS = 3000
+    SHIP_SPAWN_DISTANCE = 120
+
+    def __init__(self, seed=None, **kwargs):
+        self.ships = dict()
+        self.scores = dict()
+        self.last_bullet_times = dict()
+        self.respawn_times = dict()
+        self.next_entity_id = 1
+        super().__init__(headless=True, clock=SimulatedClock(), seed=seed, particles=False, **kwargs)
+
+    def reset(self, seed=None):
+        super().reset(seed)
+        # ships live in self.ships; the single-player ship of Game stays dead, so nothing collides with it,
+        # draws it or waits for it to leave the STARTING state
+        self.player.is_dead = True
+        self.game_state = GameState.RUNNING
+
+    def new_entity_id(self):
+        entity_id = self.next_entity_id
+        self.next_entity_id += 1
+        return entity_id
+
+    def new_asteroid(self, *args, **kwargs):
+        asteroid = super().new_asteroid(*args, **kwargs)
+        asteroid.entity_id = self.new_entity_id()
+        return asteroid
+
+    def new_bullet(self, position, normalized_velocity, owner=None, **kwargs):
+        bullet = super().new_bullet(position, normalized_velocity, **kwargs)
+        bullet.entity_id = self.new_entity_id()  # pooled bullets are new entities to the clients
+        bullet.owner = owner
+        return bullet
+
+    def new_saucer(self, position):
+        saucer = super().new_saucer(position)
+        saucer.entity_id = self.new_entity_id()
+        return saucer
+
+    def add_player(self):
+        player_id = self.new_entity_id()
+        self.scores[player_id] = 0
+        self.last_bullet_times[player_id] = -1
+        self.spawn_ship(player_id)
+        return player_id
+
+    def remove_player(self, player_id):
+        for mapping in [self.ships, self.scores, self.last_bullet_times, self.respawn_times]:
+            mapping.pop(player_id, None)
+
+    def spawn_ship(self, player_id):
+        sampler = PoissonDiskSampler(self.SHIP_SPAWN_DISTANCE, rng=self.rng)
+        tabu_positions = self.get_ship_positions() + [asteroid.position for asteroid in self.asteroids]
+        try:
+            position = sampler.sample(1, tabu_positions=tabu_positions)[0]
+        except ValueError:  # crowded field, spawn anywhere
+            position = get_random_position(self.rng)
+        ship = PlayerSpaceship(position)
+        ship.entity_id = player_id
+        ship.update_sprite()
+        self.ships[player_id] = ship
+
+    def get_ship_positions(self):
+        return [ship.get_position() for ship in self.ships.values() if not ship.is_dead]
+
+    def score_hit(self, bullet, points):
+        if bullet.owner in self.scores:
+            self.scores[bullet.owner] += points
+
+    def step(self, player_input, ticks):
+        # Game.tick() and run() advance the arena without steering any ship
+        if player_input.is_exiting:
+            self.game_state = GameState.EXITED
+            return
+        self.step_players(dict(), ticks)
+
+    def step_players(self, player_inputs, ticks):
+        for player_id, ship in self.ships.items():
+            if ship.is_dead:
+                continue
+            player_input = player_inputs.get(player_id, PlayerInput())
+            if player_input.is_shooting and ticks - self.last_bullet_times[player_id] > self.BULLET_COOLDOWN_MS:
+                self.last_bullet_times[player_id] = ticks
+                self.player_bullets.append(self.new_bullet(*ship.get_new_bullet_params(), owner=player_id))
+            ship.update_orientation(player_input.rotation_direction)
+            ship.update_position(player_input.is_accelerating)
+            velocity = ship.normalized_velocity * ship.speed
+            set_ship_velocity(ship, quantize_velocity(velocity.x), quantize_velocity(velocity.y))
+        ship_positions = self.get_ship_positions()
+        if self.saucer is not None and ship_positions:
+            target_position = min(ship_positions, key=lambda position: get_wrapped_distance(
+                position, self.saucer.get_position()))
+            bullet_params = self.saucer.maybe_shoot(target_position)
+            if bullet_params is not None:
+                self.saucer_bullets.append(self.new_bullet(*bullet_params, color=(192, 0, 0), speed=6))
+        self._age_bullets()
+        self._move_entities()
+        self._process_bullet_collisions(ticks)
+        for player_id, ship in list(self.ships.items()):
+            if ship.is_dead:
+                if ticks >= self.respawn_times[player_id]:
+                    self.spawn_ship(player_id)
+            elif self.check_player_collision(ship):
+                ship.is_dead = True
+                self.respawn_times[player_id] = ticks + self.RESPAWN_COOLDOWN_MS
+            else:
+                ship.update_sprite()
+        self._spawn(ticks)
+
+    def get_entity_records(self):
+        # id -> (kind, x, y, velocity x, velocity y, extra) of everything the clients draw, quantized
+        records = dict()
+        for kind, entities in [
+            (EntityKind.ASTEROID, self.asteroids),
+            (EntityKind.PLAYER_BULLET, self.player_bullets),
+            (EntityKind.SAUCER_BULLET, self.saucer_bullets),
+            (EntityKind.SAUCER, [] if self.saucer is None else [self.saucer]),
+            (EntityKind.PLAYER, [ship for ship in self.ships.values() if not ship.is_dead]),
+        ]:
+            for entity in entities:
+                if kind == EntityKind.PLAYER:
+                    position = entity.get_position()
+                    extra = round(entity.orientation * ORIENTATION_SCALE) % (360 * ORIENTATION_SCALE)
+                elif kind == EntityKind.ASTEROID:
+                    position = entity.position
+                    bucket, variant = entity.shape_key
+                    extra = bucket * self.asteroid_shape_cache.num_variants + variant
+                else:
+                    position = entity.position
+                    extra = 0
+                velocity = entity.normalized_velocity * entity.speed
+                records[entity.entity_id] = (
+                    kind,
+                    quantize_position(position[0], DISPLAY_PARAMS.width),
+                    quantize_position(position[1], DISPLAY_PARAMS.height),
+                    quantize_velocity(velocity[0]),
+                    quantize_velocity(velocity[1]),
+                    extra,
+                )
+        return records
+
+
+class ClientConnection:
+    MAX_QUEUED_INPUTS = 8
+
+    def __init__(self, client_socket, player_id):
+        self.socket = client_socket
+        self.player_id = player_id
+        self.receive_buffer = bytearray()
+        self.send_buffer = bytearray()
+        self.inputs = deque()
+        self.player_input = PlayerInput()
+        self.input_sequence = 0
+        self.known_records = dict()  # id -> (record, tick) as this client last received them
+        self.known_scores = dict()
+
+    def next_input(self):
+        # one input per tick, so the server replays exactly what the client predicted; repeat the last one
+        # while none is queued
+        if self.inputs:
+            self.input_sequence, self.player_input = self.inputs.popleft()
+        return self.player_input
+
+    def get_snapshot(self, tick, records, scores):
+        updates = []
+        for entity_id, record in records.items():
+            known = self.known_records.get(entity_id)
+            # the client's own ship goes out every tick: it restarts its prediction from this record and the
+            # acked input sequence, so a dead-reckoned record from an earlier tick would pull it back in time
+            if known is not None and entity_id != self.player_id:
+                known_record, known_tick = known
+                if known_record[0] == record[0] and known_record[3:] == record[3:] and get_wrapped_distance(
+                        extrapolate(known_record, tick - known_tick),
+                        (record[1] / POSITION_SCALE, record[2] / POSITION_SCALE)) <= MAX_EXTRAPOLATION_ERROR:
+                    continue
+            updates.append(ENTITY_RECORD.pack(record[0], entity_id, *record[1:]))
+            self.known_records[entity_id] = (record, tick)
+        removals = [entity_id for entity_id in self.known_records if entity_id not in records]
+        for entity_id in removals:
+            del self.known_records[entity_id]
+        changed_scores = [(player_id, score) for player_id, score in scores.items()
+                          if self.known_scores.get(player_id) != score]
+        self.known_scores.update(changed_scores)
+        return b''.join([
+            SNAPSHOT_HEADER.pack(tick, self.input_sequence, len(updates), len(removals), len(changed_scores)),
+            *updates,
+            *(REMOVAL_RECORD.pack(entity_id) for entity_id in removals),
+            *(SCORE_RECORD.pack(player_id, score) for player_id, score in changed_scores),
+        ])
+
+
+class ArenaServer:
+    # runs an ArenaGame at a fixed tick rate and streams delta snapshots to every connected client over TCP
+    MAX_SEND_BUFFER = 1024 * 1024
+
+    def __init__(self, host='127.0.0.1', port=0, seed=None, tick_rate=DISPLAY_PARAMS.tick_rate):
+        self.game = ArenaGame(seed=seed)
+        self.tick_rate = tick_rate
+        self.num_ticks = 0
+        self.num_bytes_sent = 0
+        self.listener = socket.create_server((host, port))
+        self.listener.setblocking(False)
+        self.address = self.listener.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.clients = dict()  # socket -> ClientConnection
+        self.is_running = False
+
+    def accept(self):
+        client_socket, _ = self.listener.accept()
+        client_socket.setblocking(False)
+        client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        connection = ClientConnection(client_socket, self.game.add_player())
+        connection.send_buffer += pack_message(
+            WELCOME, WELCOME_PAYLOAD.pack(connection.player_id, self.tick_rate, self.game.seed))
+        self.clients[client_socket] = connection
+        self.selector.register(client_socket, selectors.EVENT_READ)
+
+    def disconnect(self, connection):
+        self.selector.unregister(connection.socket)
+        connection.socket.close()
+        del self.clients[connection.socket]
+        self.game.remove_player(connection.player_id)
+
+    def receive(self, connection):
+        try:
+            data = connection.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self.disconnect(connection)
+            return
+        connection.receive_buffer += data
+        for message_type, payload in unpack_messages(connection.receive_buffer):
+            if message_type == INPUT:
+                sequence, flags = INPUT_PAYLOAD.unpack(payload)
+                connection.inputs.append((sequence, decode_input_flags(flags)))
+                if len(connection.inputs) > connection.MAX_QUEUED_INPUTS:
+                    connection.inputs.popleft()
+
+    def flush(self, connection):
+        try:
+            num_bytes = connection.socket.send(connection.send_buffer)
+        except (BlockingIOError, InterruptedError):
+            num_bytes = 0
+        except OSError:
+            self.disconnect(connection)
+            return
+        del connection.send_buffer[:num_bytes]
+        self.num_bytes_sent += num_bytes
+        if len(connection.send_buffer) > self.MAX_SEND_BUFFER:  # the client stopped reading
+            self.disconnect(connection)
+
+    def poll(self, timeout=0):
+        for key, _ in self.selector.select(timeout):
+            if key.fileobj is self.listener:
+                self.accept()
+            elif key.fileobj in self.clients:
+                self.receive(self.clients[key.fileobj])
+
+    def tick(self):
+        player_inputs = {connection.player_id: connection.next_input() for connection in self.clients.values()}
+        self.game.step_players(player_inputs, self.game.clock.get_ticks())
+        self.game.clock.tick()
+        self.num_ticks += 1
+        records = self.game.get_entity_records()
+        for connection in list(self.clients.values()):
+            snapshot = connection.get_snapshot(self.num_ticks, records, self.game.scores)
+            connection.send_buffer += pack_message(SNAPSHOT, snapshot)
+            self.flush(connection)
+
+    def run(self, num_ticks=None):
+        # fixed rate: network I/O fills the time until the next tick is due
+        self.is_running = True
+        tick_seconds = 1 / self.tick_rate
+        next_tick_time = time.perf_counter()
+        while self.is_running and (num_ticks is None or self.num_ticks < num_ticks):
+            self.poll(max(0.0, next_tick_time - time.perf_counter()))
+            if time.perf_counter() >= next_tick_time:
+                self.tick()
+                next_tick_time += tick_seconds
+
+    def stop(self):
+        self.is_running = False
+
+    def close(self):
+        for connection in list(self.clients.values()):
+            self.disconnect(connection)
+        self.selector.unregister(self.listener)
+        self.listener.close()
+        self.selector.close()
+
+
+class ArenaClient:
+    # keeps a dead-reckoned copy of the server's entities and predicts the local ship from its own inputs
+    def __init__(self, host, port):
+        self.socket = socket.create_connection((host, port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.receive_buffer = bytearray()
+        self.num_bytes_received = 0
+        self.records = dict()  # id -> (record, tick)
+        self.scores = dict()
+        self.server_tick = 0
+        self.input_sequence = 0
+        self.pending_inputs = deque()  # sent but not yet applied by the server
+        self.ship = None
+        self.player_id = None
+        while self.player_id is None:
+            self.receive()
+        self.socket.setblocking(False)
+
+    def receive(self):
+        try:
+            data = self.socket.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        if not data:
+            raise ConnectionError('Server closed the connection')
+        self.num_bytes_received += len(data)
+        self.receive_buffer += data
+        for message_type, payload in unpack_messages(self.receive_buffer):
+            if message_type == WELCOME:
+                self.player_id, self.tick_rate, self.seed = WELCOME_PAYLOAD.unpack(payload)
+            elif message_type == SNAPSHOT:
+                self.apply_snapshot(payload)
+
+    def poll(self):
+        self.receive()
+
+    def send_input(self, player_input):
+        self.input_sequence += 1
+        self.socket.sendall(pack_message(
+            INPUT, INPUT_PAYLOAD.pack(self.input_sequence, encode_input_flags(player_input))))
+        self.pending_inputs.append((self.input_sequence, player_input))
+        if self.ship is not None:
+            self.predict(self.ship, player_input)
+
+    def predict(self, ship, player_input):
+        # the ship half of ArenaGame.step_players; bullets and collisions stay authoritative
+        ship.update_orientation(player_input.rotation_direction)
+        ship.update_position(player_input.is_accelerating)
+        velocity = ship.normalized_velocity * ship.speed
+        set_ship_velocity(ship, quantize_velocity(velocity.x), quantize_velocity(velocity.y))
+        ship.update_sprite()
+
+    def apply_snapshot(self, payload):
+        self.server_tick, input_sequence, num_updates, num_removals, num_scores = SNAPSHOT_HEADER.unpack_from(payload)
+        offset = SNAPSHOT_HEADER.size
+        for kind, entity_id, *record in ENTITY_RECORD.iter_unpack(
+                payload[offset:offset + num_updates * ENTITY_RECORD.size]):
+            self.records[entity_id] = ((kind, *record), self.server_tick)
+        offset += num_updates * ENTITY_RECORD.size
+        for (entity_id,) in REMOVAL_RECORD.iter_unpack(payload[offset:offset + num_removals * REMOVAL_RECORD.size]):
+            self.records.pop(entity_id, None)
+        offset += num_removals * REMOVAL_RECORD.size
+        self.scores.update(SCORE_RECORD.iter_unpack(payload[offset:offset + num_scores * SCORE_RECORD.size]))
+        while self.pending_inputs and self.pending_inputs[0][0] <= input_sequence:
+            self.pending_inputs.popleft()
+        self.reconcile()
+
+    def reconcile(self):
+        # restart the local ship from the authoritative state and replay the inputs the server has not seen yet
+        if self.player_id not in self.records:
+            self.ship = None
+            return
+        (_, x, y, velocity_x, velocity_y, orientation), _ = self.records[self.player_id]
+        ship = PlayerSpaceship((x / POSITION_SCALE, y / POSITION_SCALE))
+        ship.orientation = orientation / ORIENTATION_SCALE
+        set_ship_velocity(ship, velocity_x, velocity_y)
+        ship.update_sprite()
+        for _, player_input in self.pending_inputs:
+            self.predict(ship, player_input)
+        self.ship = ship
+
+    def get_entities(self):
+        # (id, kind, position, extra) of every entity at the latest server tick, with ship orientations in
+        # degrees; the local ship is the predicted one
+        entities = []
+        for entity_id, (record, tick) in self.records.items():
+            kind, extra = record[0], record[5]
+            if entity_id == self.player_id and self.ship is not None:
+                entities.append((entity_id, kind, self.ship.get_position(), self.ship.orientation))
+                continue
+            if kind == EntityKind.PLAYER:
+                extra /= ORIENTATION_SCALE
+            entities.append((entity_id, kind, extrapolate(record, self.server_tick - tick), extra))
+        return entities
+
+    def close(self):
+        self.socket.close()
+
+
+class ArenaRenderer:
+    def __init__(self, screen, shape_cache=None):
+        self.screen = screen
+        self.shape_cache = shape_cache if shape_cache is not None else AsteroidShapeCache()
+        self.ship_atlas = PlayerSpaceship((0, 0)).rotation_atlas
+        self.sprites = {
+            EntityKind.PLAYER_BULLET: Bullet((0, 0), (0, 0)).sprite,
+            EntityKind.SAUCER_BULLET: Bullet((0, 0), (0, 0), color=(192, 0, 0)).sprite,
+            EntityKind.SAUCER: EnemySaucer((0, 0)).sprite,
+        }
+        self.font = pygame.font.Font(pygame.font.get_default_font(), 24)
+
+    def draw(self, client):
+        self.screen.fill(DISPLAY_PARAMS.bg_color)
+        for entity_id, kind, position, extra in client.get_entities():
+            if kind == EntityKind.PLAYER:
+                sprite = self.ship_atlas.get_sprite(extra)
+            elif kind == EntityKind.ASTEROID:
+                sprite = self.shape_cache.get_shape(divmod(extra, self.shape_cache.num_variants))[0]
+            else:
+                sprite = self.sprites[kind]
+            self.screen.blit(sprite, sprite.get_rect(center=position))
+        for i, (player_id, score) in enumerate(sorted(client.scores.items())):
+            color = (192, 0, 0) if player_id == client.player_id else (128, 128, 128)
+            self.screen.blit(self.font.render(f'{score}', True, color), (10, 10 + i * 30))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Multiplayer jetblack over TCP.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    serve_parser = subparsers.add_parser('serve', help='run a headless authoritative server')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=5555)
+    serve_parser.add_argument('--seed', type=int)
+    connect_parser = subparsers.add_parser('connect', help='join a server')
+    connect_parser.add_argument('--host', default='127.0.0.1')
+    connect_parser.add_argument('--port', type=int, default=5555)
+    args = parser.parse_args()
+    if args.command == 'serve':
+        server = ArenaServer(args.host, args.port, seed=args.seed)
+        print(f'Serving on {server.address[0]}:{server.address[1]}')
+        try:
+            server.run()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+    else:
+        pygame.init()
+        pygame.display.set_caption('jetblack arena')
+        screen = pygame.display.set_mode((DISPLAY_PARAMS.width, DISPLAY_PARAMS.height))
+        client = ArenaClient(args.host, args.port)
+        renderer = ArenaRenderer(screen)
+        keyboard = KeyboardInput()
+        clock = pygame.time.Clock()
+        while True:
+            player_input = keyboard.read()
+            if player_input.is_exiting:
+                break
+            client.send_input(player_input)
+            client.poll()
+            renderer.draw(client)
+            pygame.display.flip()
+            clock.tick(client.tick_rate)
+        client.close()
@@ -0,0 +1,64 @@
+import hashlib
+import threading
+
+import pygame
+import pytest
+
+from jetblack import FrameRecorder, Game, PlayerInput, ScriptedInput, SimulatedClock
+
+
+def get_digest(surface):
+    return hashlib.md5(pygame.image.tobytes(surface, 'RGB')).hexdigest()
+
+
+@pytest.mark.parametrize('capture_format', ['zlib', 'raw'])
+def test_loaded_capture_matches_drawn_frames(tmp_path, capture_format):
+    path = tmp_path / 'frames.jbc'
+    inputs = [PlayerInput(1, True, True)] * 20
+    game = Game(input_source=ScriptedInput(inputs), clock=SimulatedClock(), seed=1, headless=True, capture=path,
+                capture_format=capture_format)
+    drawn = []
+    capture = game.frame_recorder.capture
+
+    def record_and_capture(surface, num_ticks):
+        drawn.append((num_ticks, get_digest(surface)))
+        return capture(surface, num_ticks)
+
+    game.frame_recorder.capture = record_and_capture
+    game.run()
+    game.close()
+    assert game.frame_recorder.num_dropped == 0
+    assert [(num_ticks, get_digest(surface)) for num_ticks, surface in FrameRecorder.load(path)] == drawn
+    assert len(drawn) == len(inputs)
+
+
+class FailingFile:
+    def write(self, data):
+        raise OSError('disk full')
+
+    def close(self):
+        pass
+
+
+def test_writer_errors_are_raised_instead_of_blocking(tmp_path):
+    surface = pygame.Surface((64, 48))
+    recorder = FrameRecorder(tmp_path / 'frames.jbc', surface, num_buffers=2, is_blocking=True)
+    recorder.file.close()
+    recorder.file = FailingFile()
+    errors = []
+
+    def capture_frames():
+        try:
+            for num_ticks in range(10):
+                recorder.capture(surface, num_ticks)
+        except OSError as error:
+            errors.append(error)
+
+    # a regression would block forever on a free buffer, so capture on a thread we can give up on
+    thread = threading.Thread(target=capture_frames, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive()
+    assert [str(error) for error in errors] == ['disk full']
+    with pytest.raises(OSError, match='disk full'):
+        recorder.close()
@@ -0,0 +1,144 @@
+import random
+
+import pygame
+import pytest
+
+from jetblack import Game, GameState, PlayerInput, Replay, ReplayPlayback, ScriptedInput, SimulatedClock
+
+NUM_TICKS = 600
+
+
+class FullScan:
+    # stands in for the SpatialHash broadphase: every asteroid is a candidate for every query
+    def __init__(self):
+        self.num_rects = 0
+
+    def rebuild(self, rects):
+        self.num_rects = len(list(rects))
+
+    def rebuild_from_arrays(self, topleft, sizes):
+        self.num_rects = len(topleft)
+
+    def query(self, rect):
+        return range(self.num_rects)
+
+
+def get_inputs(seed):
+    rng = random.Random(seed)
+    return [
+        # mostly turning and shooting, which keeps the ship alive long enough to hit things
+        PlayerInput(rng.choice([-1, 1, 1]), rng.random() < 0.05, rng.random() < 0.5)
+        for _ in range(NUM_TICKS)
+    ]
+
+
+def get_state(game):
+    return (
+        game.game_state,
+        game.scoreboard.get_score(),
+        tuple(game.player.rect),
+        game.player.orientation,
+        [tuple(asteroid.rect) for asteroid in game.asteroids],
+        [tuple(bullet.rect) for bullet in game.player_bullets + game.saucer_bullets],
+        None if game.saucer is None else tuple(game.saucer.rect),
+    )
+
+
+def new_game(seed, inputs=None, **kwargs):
+    inputs = get_inputs(seed) if inputs is None else inputs
+    game = Game(input_source=ScriptedInput(inputs), clock=SimulatedClock(), seed=seed, **kwargs)
+    # a crowded field so that the broadphase has plenty to sort out
+    game.asteroids.extend(game.new_asteroid() for _ in range(10))
+    return game
+
+
+def run_game(game):
+    trace = []
+    while game.game_state != GameState.EXITED:
+        game.game_loop()
+        trace.append(get_state(game))
+    game.close()
+    return trace
+
+
+def get_trace(seed, full_scan=False, **kwargs):
+    game = new_game(seed, **kwargs)
+    if full_scan:
+        game.asteroid_grid = FullScan()
+    trace = run_game(game)
+    assert any(state[1] > 0 for state in trace)
+    return trace
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_headless_matches_windowed(seed):
+    assert get_trace(seed, headless=True) == get_trace(seed)
+
+
+@pytest.mark.parametrize('precise_collisions', [True, False])
+@pytest.mark.parametrize('entity_store', [False, True])
+def test_broadphase_matches_full_scan(precise_collisions, entity_store):
+    kwargs = dict(headless=True, precise_collisions=precise_collisions, entity_store=entity_store)
+    assert get_trace(1, **kwargs) == get_trace(1, full_scan=True, **kwargs)
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_entity_store_matches_objects(seed):
+    assert get_trace(seed, headless=True, entity_store=True) == get_trace(seed, headless=True)
+
+
+@pytest.mark.parametrize('headless', [True, False])
+def test_replay_matches_recorded_game(tmp_path, headless):
+    game = new_game(1, headless=headless, record=True)
+    trace = run_game(game)
+    game.replay.save(tmp_path / 'session.jbr')
+    playback = ReplayPlayback(Replay.load(tmp_path / 'session.jbr'))
+    replayed = Game(input_source=playback, clock=playback, seed=playback.replay.seed, headless=True)
+    replayed.asteroids.extend(replayed.new_asteroid() for _ in range(10))
+    assert run_game(replayed) == trace
+
+
+@pytest.mark.parametrize('entity_store', [False, True])
+def test_forked_snapshot_matches_original(entity_store):
+    # the fork starts from a fresh clock, so every timer has to be rebased onto it. Simulated clocks floor
+    # 1000 / 60 ms ticks, so the two clocks only step alike when they are in phase every 3 ticks (50 ms)
+    inputs = get_inputs(1)
+    game = new_game(1, inputs=inputs, headless=True, entity_store=entity_store)
+    for _ in range(201):
+        game.game_loop()
+    fork = Game(input_source=ScriptedInput(inputs[201:]), clock=SimulatedClock(), seed=7, headless=True,
+                entity_store=entity_store)
+    fork.load_state(game.save_state())
+    assert run_game(fork) == run_game(game)
+
+
+def test_rewind_replays_the_same_trace():
+    # the clock keeps running across the rewind, so timers have to be rebased onto its current time; it stops
+    # in phase with the snapshots (see above)
+    inputs = get_inputs(1)
+    trace = run_game(new_game(1, inputs=inputs, headless=True))
+    game = new_game(1, inputs=inputs[:402], headless=True, rewind=True)
+    run_game(game)
+    game.game_state = GameState.RUNNING
+    assert game.rewind(150)
+    num_ticks = game.num_ticks
+    game.input_source = ScriptedInput(inputs[num_ticks:])
+    assert run_game(game) == trace[num_ticks:]
+
+
+def test_stored_entities_move_like_objects():
+    # the per-object update_position() has to keep working on entities that live in the store
+    entities = []
+    for entity_store in [False, True]:
+        game = Game(headless=True, clock=SimulatedClock(), seed=1, entity_store=entity_store)
+        asteroid = game.new_asteroid(pygame.Vector2(100, 100))
+        asteroid.normalized_velocity = pygame.Vector2(-0.6, 0.8)
+        bullet = game.new_bullet(pygame.Vector2(1500, 850), pygame.Vector2(0.8, 0.6))
+        entities.append([asteroid, bullet])
+    for _ in range(300):
+        for entity, stored_entity in zip(*entities):
+            entity.update_position()
+            stored_entity.update_position()
+            assert stored_entity.position == entity.position
+            assert stored_entity.rect == entity.rect
+    assert entities[1][0].position != pygame.Vector2(100, 100)
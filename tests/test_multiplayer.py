@@ -0,0 +1,77 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from jetblack import GameState, PlayerInput
+from jetblack_multiplayer import ArenaClient, ArenaGame, ArenaServer
+
+
+def exchange(server, clients):
+    # lockstep: every client sends one input, the server applies them in one tick, every client receives it
+    for _ in range(100):
+        server.poll()
+        if all(len(connection.inputs) for connection in server.clients.values()):
+            break
+    server.tick()
+    for client in clients:
+        while client.server_tick < server.num_ticks:
+            client.poll()
+
+
+def connect(server, num_clients):
+    # clients block until they are welcomed, so the server accepts them meanwhile
+    with ThreadPoolExecutor(num_clients) as executor:
+        futures = [executor.submit(ArenaClient, *server.address) for _ in range(num_clients)]
+        while not all(future.done() for future in futures):
+            server.poll(0.01)
+            for connection in list(server.clients.values()):
+                server.flush(connection)
+        return [future.result() for future in futures]
+
+
+@pytest.fixture
+def server():
+    server = ArenaServer(seed=3)
+    yield server
+    server.close()
+
+
+def get_authoritative_position(server, client):
+    ship = server.game.ships[client.player_id]
+    return None if ship.is_dead else ship.get_position()
+
+
+@pytest.mark.parametrize('player_input', [
+    PlayerInput(is_accelerating=True),  # straight up at a constant speed once at full thrust
+    PlayerInput(rotation_direction=1, is_accelerating=True, is_shooting=True),
+])
+def test_predicted_ship_matches_server(server, player_input):
+    clients = connect(server, 3)
+    try:
+        for tick in range(300):
+            for client in clients:
+                client.send_input(player_input if client is clients[0] else PlayerInput())
+            predicted_position = None if clients[0].ship is None else clients[0].ship.get_position()
+            exchange(server, clients)
+            authoritative_position = get_authoritative_position(server, clients[0])
+            if predicted_position is not None and authoritative_position is not None:
+                assert predicted_position == authoritative_position, tick
+            for client in clients:
+                if client.ship is not None:
+                    assert client.ship.get_position() == get_authoritative_position(server, client), tick
+    finally:
+        for client in clients:
+            client.close()
+
+
+def test_arena_game_runs_as_a_game():
+    game = ArenaGame(seed=1)
+    player_id = game.add_player()
+    for _ in range(120):
+        game.tick(PlayerInput(), game.get_simulation_ticks())
+        game.clock.tick()
+    assert game.game_state == GameState.RUNNING
+    assert game.player.is_dead
+    assert player_id in game.ships
+    game.tick(PlayerInput(is_exiting=True), game.get_simulation_ticks())
+    assert game.game_state == GameState.EXITED
@@ -0,0 +1,32 @@
+import threading
+
+import pytest
+
+from jetblack import Game, PipelinedRunner, PlayerInput, RealtimeClock
+
+
+class EndlessInput:
+    # never exits, so only the simulation thread can stop the runner
+    def read(self):
+        return PlayerInput()
+
+
+def test_simulation_errors_are_raised_from_run():
+    game = Game(input_source=EndlessInput(), clock=RealtimeClock(1000), seed=1)
+    tick = game.tick
+
+    def failing_tick(player_input, ticks):
+        if game.num_ticks == 10:
+            raise RuntimeError('simulation failed')
+        tick(player_input, ticks)
+
+    game.tick = failing_tick
+    runner = PipelinedRunner(game)
+    timer = threading.Timer(10, setattr, (runner, 'is_running', False))  # keeps a regression from hanging
+    timer.start()
+    try:
+        with pytest.raises(RuntimeError, match='simulation failed'):
+            runner.run()
+    finally:
+        timer.cancel()
+    assert not runner.is_running